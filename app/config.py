@@ -0,0 +1,106 @@
+import os
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    return int(value)
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    return float(value)
+
+
+# Number of worker processes used for face inference.
+# 0 = run inference in a background thread inside the API process (dev/testing).
+FACE_WORKERS = _env_int("FACE_WORKERS", os.cpu_count() or 1)
+
+# Admission control (app/utils/admission.py): face verifications running at once, how many
+# may wait for a slot and for how long before the request gets 429 + Retry-After
+ADMISSION_MAX_CONCURRENT = _env_int("ADMISSION_MAX_CONCURRENT", max(1, FACE_WORKERS) * 2)
+ADMISSION_QUEUE_DEPTH = _env_int("ADMISSION_QUEUE_DEPTH", 50)
+ADMISSION_MAX_WAIT_S = _env_float("ADMISSION_MAX_WAIT_S", 5.0)
+
+# Image preprocessing: uploads are decoded/downscaled so the longest side is at most this
+# many pixels before face detection. Lower = faster, higher = detects smaller faces.
+FACE_MAX_DIMENSION = _env_int("FACE_MAX_DIMENSION", 800)
+# Classroom photos contain many small faces, so they keep more resolution
+GROUP_PHOTO_MAX_DIMENSION = _env_int("GROUP_PHOTO_MAX_DIMENSION", 1600)
+# How many times the HOG detector upsamples the image looking for smaller faces
+FACE_DETECTION_UPSAMPLE = _env_int("FACE_DETECTION_UPSAMPLE", 1)
+
+# Face embeddings are stored in the versioned format of app/utils/embedding_codec.py.
+# float32 halves and float16 quarters the size of the legacy float64 blobs (and of the galleries).
+EMBEDDING_DTYPE = os.getenv("EMBEDDING_DTYPE", "float32")
+# Up to MAX_FACE_TEMPLATES enrollment photos per student; a probe is compared with the
+# "best" (closest) template or with the "mean" of the templates
+MAX_FACE_TEMPLATES = _env_int("MAX_FACE_TEMPLATES", 5)
+FACE_TEMPLATE_MATCHING = os.getenv("FACE_TEMPLATE_MATCHING", "best")
+
+# Memory-mapped embedding store shared by all API workers (app/utils/embedding_store.py)
+EMBEDDING_STORE_DIR = os.getenv("EMBEDDING_STORE_DIR", "assets/embeddings")
+
+# Quality gate: photos outside these limits are rejected before the (expensive) encoder runs.
+# Brightness is the mean gray level (0-255), sharpness the variance of the Laplacian,
+# face size the height in pixels of the face after downscaling to FACE_MAX_DIMENSION.
+FACE_MIN_BRIGHTNESS = _env_float("FACE_MIN_BRIGHTNESS", 40.0)
+FACE_MAX_BRIGHTNESS = _env_float("FACE_MAX_BRIGHTNESS", 220.0)
+FACE_MIN_SHARPNESS = _env_float("FACE_MIN_SHARPNESS", 50.0)
+FACE_MIN_SIZE = _env_int("FACE_MIN_SIZE", 60)
+
+# Largest accepted photo upload; bigger request bodies are rejected with 413 before parsing
+MAX_UPLOAD_BYTES = _env_int("MAX_UPLOAD_BYTES", 10 * 1024 * 1024)
+
+# Evidence photo store (see app/utils/evidence_store.py): photos are recompressed so the
+# longest side is at most EVIDENCE_MAX_DIMENSION, plus a EVIDENCE_THUMBNAIL_SIZE thumbnail
+EVIDENCE_DIR = os.getenv("EVIDENCE_DIR", "assets/evidence")
+EVIDENCE_MAX_DIMENSION = _env_int("EVIDENCE_MAX_DIMENSION", 1280)
+EVIDENCE_JPEG_QUALITY = _env_int("EVIDENCE_JPEG_QUALITY", 80)
+EVIDENCE_THUMBNAIL_SIZE = _env_int("EVIDENCE_THUMBNAIL_SIZE", 160)
+
+# Retention job (python -m app.utils.retention): sessions older than RETENTION_DAYS get their
+# evidence packed into one archive per session under EVIDENCE_ARCHIVE_DIR
+RETENTION_DAYS = _env_int("RETENTION_DAYS", 180)
+EVIDENCE_ARCHIVE_DIR = os.getenv("EVIDENCE_ARCHIVE_DIR", "assets/archive")
+
+# Idempotent submissions (app/utils/idempotency.py): results kept for client retries
+IDEMPOTENCY_MAX_ENTRIES = _env_int("IDEMPOTENCY_MAX_ENTRIES", 100000)
+
+# Seconds that cached students / memberships / sessions / attended sets stay valid.
+# Changes made through this process invalidate immediately; the TTL only bounds
+# staleness for changes made by other workers or scripts.
+ADMISSION_CACHE_TTL = _env_float("ADMISSION_CACHE_TTL", 60.0)
+
+# Seconds a cached report (app/utils/report_cache.py) is served. Commits in this process
+# invalidate it at once; the TTL bounds staleness from other workers, the rollup/retention
+# jobs and scripts. An unchanged report keeps its ETag, so clients still get 304s.
+REPORT_CACHE_TTL = _env_float("REPORT_CACHE_TTL", 30.0)
+
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./sql_app.db")
+# URL for the async engine used by the async endpoints. Empty = derived from DATABASE_URL
+# (sqlite:// -> sqlite+aiosqlite://).
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", "")
+# "default" = SQLite defaults (rollback journal). "production" = WAL + tuned pragmas below,
+# which lets readers run while a check-in is being written.
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "default")
+SQLITE_BUSY_TIMEOUT_MS = _env_int("SQLITE_BUSY_TIMEOUT_MS", 5000)
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL") # NORMAL is durable enough in WAL mode
+SQLITE_CACHE_SIZE_KB = _env_int("SQLITE_CACHE_SIZE_KB", 65536)
+SQLITE_MMAP_SIZE = _env_int("SQLITE_MMAP_SIZE", 268435456) # 256 MB
+DB_POOL_SIZE = _env_int("DB_POOL_SIZE", 10)
+DB_MAX_OVERFLOW = _env_int("DB_MAX_OVERFLOW", 20)
+
+# Group commit: attendance inserts arriving within this window are written in one transaction
+GROUP_COMMIT_WINDOW_MS = _env_float("GROUP_COMMIT_WINDOW_MS", 5.0)
+GROUP_COMMIT_MAX_BATCH = _env_int("GROUP_COMMIT_MAX_BATCH", 100)
+
+# On-demand profiling (app/utils/profiling.py). Empty token = profiling unavailable:
+# the middleware is not installed and the /debug/profile endpoints answer 404.
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN", "")
+PROFILE_DIR = os.getenv("PROFILE_DIR", "assets/profiles")
+PROFILE_SAMPLE_INTERVAL_MS = _env_float("PROFILE_SAMPLE_INTERVAL_MS", 2.0)
+PROFILE_MAX_REQUESTS = _env_int("PROFILE_MAX_REQUESTS", 100)
@@ -1,13 +1,72 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from app import config
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./sql_app.db"
+SQLALCHEMY_DATABASE_URL = config.DATABASE_URL
+
+def _async_url(url: str) -> str:
+    if config.ASYNC_DATABASE_URL:
+        return config.ASYNC_DATABASE_URL
+    if url.startswith("sqlite://"):
+        return "sqlite+aiosqlite://" + url[len("sqlite://"):]
+    return url
+
+def _engine_options() -> dict:
+    options = {"connect_args": {"check_same_thread": False}}
+    if config.SQLITE_PROFILE == "production":
+        options["connect_args"]["timeout"] = config.SQLITE_BUSY_TIMEOUT_MS / 1000
+        options["pool_size"] = config.DB_POOL_SIZE
+        options["max_overflow"] = config.DB_MAX_OVERFLOW
+    return options
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **_engine_options())
+# Same database through an async driver (aiosqlite), so async routes await their queries
+# instead of blocking the event loop
+async_engine = create_async_engine(_async_url(SQLALCHEMY_DATABASE_URL), **_engine_options())
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    if config.SQLITE_PROFILE != "production":
+        return
+    cursor = dbapi_connection.cursor()
+    # WAL: readers don't block the writer and vice versa
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA synchronous={config.SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={config.SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA cache_size=-{config.SQLITE_CACHE_SIZE_KB}")
+    cursor.execute(f"PRAGMA mmap_size={config.SQLITE_MMAP_SIZE}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+event.listen(engine, "connect", _apply_sqlite_pragmas)
+event.listen(async_engine.sync_engine, "connect", _apply_sqlite_pragmas)
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# expire_on_commit=False: attributes of committed objects can be read without another (awaited) load
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
 
 Base = declarative_base()
 
+
+async def get_async_db():
+    """
+    Dependency for async routes. Sync routes keep their own get_db with SessionLocal.
+    Sync helpers (caches, rollup) run on it via `await db.run_sync(helper, ...)`.
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def init_db():
+    """
+    Creates missing tables. Run once at startup (see app.main) or manually:
+    python -m app.database
+    """
+    from app import models  # noqa: F401 - registers the tables on Base.metadata
+    Base.metadata.create_all(bind=engine)
+
+
+if __name__ == "__main__":
+    init_db()
+    print("Database schema ready.")
@@ -1,14 +1,44 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from app.routes import health_routes, student_routes, attendance_routes, class_routes, report_routes
-from app.database import engine, Base
+from app import config
+from app.routes import health_routes, student_routes, attendance_routes, class_routes, report_routes, debug_routes
+from app.database import SessionLocal, async_engine, init_db
+from app.utils import rollup
+from app.utils.embedding_store import embedding_store
+from app.utils.face_engine import face_engine
+from app.utils.group_commit import attendance_writer
+from app.utils.profiling import ProfilingMiddleware
+from app.utils.uploads import UploadSizeLimitMiddleware
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Create tables (explicit startup step instead of an import side effect)
+    init_db()
+    # Backfill rollup rows for memberships created outside the API (cheap when none are missing)
+    with SessionLocal() as db:
+        rollup.ensure_rows(db)
+        db.commit()
+        # Map the shared embedding store; the first start exports it
+        if embedding_store.refresh() is None:
+            embedding_store.export(db)
+            embedding_store.refresh()
+    # Start face inference workers before accepting traffic
+    face_engine.start()
+    attendance_writer.start()
+    yield
+    await attendance_writer.stop()
+    face_engine.shutdown()
+    await async_engine.dispose()
 
-app = FastAPI(title="Smart Presence Backend")
+app = FastAPI(title="Smart Presence Backend", lifespan=lifespan)
+app.add_middleware(UploadSizeLimitMiddleware)
+if config.PROFILING_TOKEN:
+    # Opt-in: without a token production requests never pass through the profiler
+    app.add_middleware(ProfilingMiddleware)
 
 app.include_router(health_routes.router)
 app.include_router(student_routes.router)
 app.include_router(attendance_routes.router)
 app.include_router(class_routes.router)
 app.include_router(report_routes.router)
+app.include_router(debug_routes.router)
@@ -20,12 +20,13 @@ class Student(Base):
     name = Column(String, index=True)
     nim = Column(String, unique=True, index=True)
     class_id = Column(Integer, ForeignKey("classes.id"))
-    # Storing face encoding as bytes (numpy array dumped)
+    # Primary face embedding (app/utils/embedding_codec.py format; legacy rows: raw float64 bytes)
     face_encoding = Column(LargeBinary, nullable=True)
 
     student_class = relationship("Class", back_populates="students")
     attendances = relationship("Attendance", back_populates="student")
     memberships = relationship("ClassMember", back_populates="member_student")
+    face_templates = relationship("FaceTemplate", back_populates="student")
 
 class Attendance(Base):
     __tablename__ = "attendances"
@@ -69,3 +70,66 @@ class ClassMember(Base):
 
     member_class = relationship("Class", back_populates="members")
     member_student = relationship("Student", back_populates="memberships")
+
+class AttendanceRollup(Base):
+    """
+    Pre-aggregated attendance per student per class, kept up to date in the same
+    transaction as every attendance insert and session create/delete (see app/utils/rollup.py).
+    Reports read this table instead of scanning attendances.
+    """
+    __tablename__ = "attendance_rollups"
+    __table_args__ = (
+        UniqueConstraint('student_id', 'class_id', name='_rollup_student_class_uc'),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    student_id = Column(Integer, ForeignKey("students.id"), index=True)
+    class_id = Column(Integer, ForeignKey("classes.id"), index=True)
+    sessions_held = Column(Integer, default=0) # Active sessions of the class
+    present_count = Column(Integer, default=0) # 'Hadir' in those sessions
+    last_attended = Column(DateTime, nullable=True)
+
+class SessionArchive(Base):
+    """
+    One row per session processed by the retention job (app/utils/retention.py):
+    its evidence photos were packed into archive_path and the loose files removed.
+    """
+    __tablename__ = "session_archives"
+
+    session_id = Column(Integer, ForeignKey("attendance_sessions.id"), primary_key=True)
+    archive_path = Column(String, nullable=True) # None when the session had no evidence files
+    file_count = Column(Integer, default=0)
+    rows_archived = Column(Integer, default=0) # Attendance rows moved to attendance_archive
+    archived_at = Column(DateTime, default=datetime.now)
+
+class AttendanceArchive(Base):
+    """
+    Attendance rows of archived sessions, moved out of the attendances table so the
+    active-semester queries stay small. Same columns (and ids) as Attendance.
+    Rollup rebuilds still count them (see report_service.attendance_history).
+    """
+    __tablename__ = "attendance_archive"
+
+    id = Column(Integer, primary_key=True)
+    student_id = Column(Integer, ForeignKey("students.id"), index=True)
+    session_id = Column(Integer, ForeignKey("attendance_sessions.id"), index=True)
+    timestamp = Column(DateTime)
+    date = Column(String)
+    status = Column(String)
+    method = Column(String)
+    confidence_score = Column(Float)
+    image_path = Column(String, nullable=True)
+
+class FaceTemplate(Base):
+    """
+    Additional enrollment embeddings of a student (Student.face_encoding stays the
+    primary one). Blobs use the format of app/utils/embedding_codec.py.
+    """
+    __tablename__ = "face_templates"
+
+    id = Column(Integer, primary_key=True, index=True)
+    student_id = Column(Integer, ForeignKey("students.id"), index=True)
+    embedding = Column(LargeBinary)
+    created_at = Column(DateTime, default=datetime.now)
+
+    student = relationship("Student", back_populates="face_templates")
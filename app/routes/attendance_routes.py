@@ -1,17 +1,30 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException, Response, UploadFile, File, Form
+from fastapi.responses import FileResponse, JSONResponse
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.database import SessionLocal
+from app.database import SessionLocal, get_async_db
 from app import models, schemas
-from app.utils.ai_service import validate_face
+from app.utils.admission import face_admission, Overloaded
+from app.utils.admission_cache import admission_cache, SessionEntry
+from app.utils.ai_service import ImageQualityError
+from app.utils.face_engine import face_engine
+from app.utils.face_gallery import gallery_cache
+from app.utils import embedding_codec
+from app.utils.group_commit import attendance_writer, AttendanceJob
+from app.utils import evidence_store, metrics, rollup
+from app.utils.uploads import read_upload
+from app.utils.idempotency import Claim, idempotency_cache, submission_key
+from app.utils.export import export_response
 from datetime import datetime
-import os
 import shutil
-import uuid
 from typing import Optional
 
 router = APIRouter(prefix="/attendance", tags=["attendance"])
 
+MIN_FACE_SCORE = 0.8
+
 def get_db():
     db = SessionLocal()
     try:
@@ -19,6 +32,57 @@ def get_db():
     finally:
         db.close()
 
+def _overloaded_response(e: Overloaded) -> JSONResponse:
+    return JSONResponse(
+        status_code=429,
+        headers={"Retry-After": str(e.retry_after)},
+        content={"status": "gagal", "message": f"Server sedang sibuk, coba lagi dalam {e.retry_after} detik.", "data": None}
+    )
+
+def _outcome(outcome: str, response):
+    # Counts the submission under presence_attendance_outcomes_total and passes the response through
+    metrics.outcomes.inc(outcome)
+    return response
+
+def _session_end(session: SessionEntry) -> datetime:
+    return datetime.strptime(f"{session.date} {session.end_time}", "%Y-%m-%d %H:%M")
+
+def _no_active_session_response() -> JSONResponse:
+    return JSONResponse(
+        status_code=403,
+        content={"status": "gagal", "message": "Tidak ada sesi absensi aktif saat ini (Di luar jam sesi).", "data": None}
+    )
+
+
+def _new_job(
+    student_id: int,
+    session: SessionEntry,
+    method: str,
+    confidence_score: float,
+    image_path: str,
+    now: datetime
+) -> AttendanceJob:
+    return AttendanceJob(
+        student_id=student_id,
+        session_id=session.id,
+        class_id=session.class_id,
+        method=method,
+        confidence_score=confidence_score,
+        image_path=image_path,
+        timestamp=now
+    )
+
+async def _record_attendance(job: AttendanceJob) -> Optional[schemas.Attendance]:
+    """
+    Inserts the attendance row through the group-commit writer (the only DB write
+    on the accept path). Returns None if the student already attended this session -
+    another request can win the race between the cached duplicate check and this insert.
+    """
+    with metrics.timer("attendance_insert"):
+        result = await attendance_writer.submit(job)
+    admission_cache.mark_attended(job.session_id, [job.student_id])
+    return result
+
 @router.post("/sessions/", response_model=schemas.AttendanceSession)
 def create_session(session: schemas.AttendanceSessionCreate, db: Session = Depends(get_db)):
     # Create new session
@@ -32,8 +96,11 @@ def create_session(session: schemas.AttendanceSessionCreate, db: Session = Depen
         is_active=session.is_active
     )
     db.add(new_session)
+    db.flush()
+    rollup.session_created(db, new_session)
     db.commit()
     db.refresh(new_session)
+    admission_cache.invalidate_sessions(new_session.class_id)
     return new_session
 
 @router.get("/sessions/", response_model=list[schemas.AttendanceSession])
@@ -59,128 +126,300 @@ def delete_session(session_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Session not found")
     
     # Soft delete: Just set is_active to False
-    session.is_active = False
+    if session.is_active:
+        session.is_active = False
+        rollup.session_deactivated(db, session)
     db.commit()
+    admission_cache.invalidate_sessions(session.class_id, session.id)
+    idempotency_cache.invalidate_session(session.id)
     return {"status": "success", "message": "Session deactivated"}
 
 @router.post("/", response_model=schemas.AttendanceResponse)
 async def submit_attendance(
+    background_tasks: BackgroundTasks,
     nim: str = Form(...),
     class_id: int = Form(...), # Ditambahkan sesuai request: Identitas Kelas
     method: str = Form(...), # Ditambahkan sesuai request: Metode Absensi (face, qr, pin)
     file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    idempotency_key: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db)
+):
+    # 0. Retry dari client (Idempotency-Key atau foto yang sama): kirim ulang hasil pertama
+    with metrics.timer("upload_read"):
+        content = await read_upload(file)
+        photo_hash = evidence_store.content_hash(content)
+    key = submission_key(nim, class_id, method, idempotency_key, photo_hash)
+    async with idempotency_cache.claim(key) as claim:
+        if claim.response is not None:
+            return _outcome("idempotent_replay", claim.response)
+        return await _submit_attendance(claim, background_tasks, nim, class_id, method, content, photo_hash, db)
+
+async def _submit_attendance(
+    claim: Claim,
+    background_tasks: BackgroundTasks,
+    nim: str,
+    class_id: int,
+    method: str,
+    content: bytes,
+    photo_hash: str,
+    db: AsyncSession
 ):
     # 1. Cari Data Siswa (Identitas Siswa)
-    student = db.query(models.Student).filter(models.Student.nim == nim).first()
+    # Lookups 1-3 are served from admission_cache, so rejections never touch the DB.
+    # Cache misses run the sync lookup on the async session (run_sync), off the event loop's I/O path.
+    with metrics.timer("lookup_student"):
+        student = await db.run_sync(admission_cache.get_student, nim)
     if not student:
-        return {"status": "gagal", "message": "Siswa tidak ditemukan", "data": None}
+        return _outcome("unknown_student", {"status": "gagal", "message": "Siswa tidak ditemukan", "data": None})
 
     # 2. Validasi Kelas (Memastikan siswa mengirim identitas kelas yang benar)
     if student.class_id != class_id:
-        return {"status": "gagal", "message": "Siswa tidak terdaftar di kelas ini", "data": None}
+        return _outcome("wrong_class", {"status": "gagal", "message": "Siswa tidak terdaftar di kelas ini", "data": None})
 
     # 2.5 CEK MEMBERSHIP (New Feature)
     # Pastikan student benar-benar terdaftar sebagai member di kelas tersebut
-    is_member = db.query(models.ClassMember).filter(
-        models.ClassMember.class_id == class_id, 
-        models.ClassMember.student_id == student.id
-    ).first()
-    
     # Optional strict check: if membership table is populated, enforce it.
+    with metrics.timer("lookup_membership"):
+        is_member = await db.run_sync(admission_cache.is_member, class_id, student.id)
     if not is_member:
-         return {"status": "gagal", "message": "Validasi Gagal: Mahasiswa bukan anggota kelas ini.", "data": None}
+         return _outcome("not_member", {"status": "gagal", "message": "Validasi Gagal: Mahasiswa bukan anggota kelas ini.", "data": None})
 
     # 2.6 CEK SESI AKTIF (New Feature)
     now = datetime.now()
-    today_str = now.strftime("%Y-%m-%d")
-    current_time_str = now.strftime("%H:%M")
-
-    active_session = db.query(models.AttendanceSession).filter(
-        models.AttendanceSession.class_id == class_id,
-        models.AttendanceSession.date == today_str,
-        models.AttendanceSession.is_active == True,
-        models.AttendanceSession.start_time <= current_time_str,
-        models.AttendanceSession.end_time >= current_time_str
-    ).first()
+    with metrics.timer("lookup_session"):
+        active_session = await db.run_sync(admission_cache.get_active_session, class_id, now)
 
     if not active_session:
          # Mengembalikan HTTP 403 sesuai request
-        return JSONResponse(
-            status_code=403,
-            content={"status": "gagal", "message": "Tidak ada sesi absensi aktif saat ini (Di luar jam sesi).", "data": None}
-        )
+        return _outcome("no_session", _no_active_session_response())
 
     # 2.7 VALIDASI METODE (New Feature)
     # Pastikan metode yang dikirim siswa (misal: 'face') SAMA dengan metode sesi (misal: 'face')
     if active_session.method != method:
-         return {"status": "gagal", "message": f"Metode absensi salah! Sesi ini mengharuskan metode: {active_session.method}", "data": None}
+         return _outcome("wrong_method", {"status": "gagal", "message": f"Metode absensi salah! Sesi ini mengharuskan metode: {active_session.method}", "data": None})
 
     # 3. Cek Absen Ganda (Anti-Double)
     # Gunakan session_id untuk pengecekan yang lebih akurat (Per Sesi, bukan Per Hari)
-    existing_attendance = db.query(models.Attendance).filter(
-        models.Attendance.student_id == student.id,
-        models.Attendance.session_id == active_session.id
-    ).first()
+    with metrics.timer("lookup_duplicate"):
+        has_attended = await db.run_sync(admission_cache.has_attended, active_session.id, student.id)
+    if has_attended:
+        return _outcome("duplicate", {"status": "gagal", "message": "Siswa sudah melakukan absensi di sesi ini.", "data": None})
 
-    if existing_attendance:
-        return {"status": "gagal", "message": "Siswa sudah melakukan absensi di sesi ini.", "data": None}
+    # The insert goes through attendance_writer: give the pooled connection back
+    # instead of holding it during face inference
+    await db.close()
+
+    # From here on results are final for this photo: retries get them from the idempotency cache
+    session_end = _session_end(active_session)
 
     # 4. Validasi Wajah dengan AI
-    content = await file.read()
     confidence_score = 0.0
 
     if method == "face":
-        if student.face_encoding:
-            is_match, score = validate_face(content, student.face_encoding)
+        if student.face_templates:
+            # Only this stage is queued/limited; the checks above never wait for a slot
+            try:
+                async with face_admission.slot():
+                    is_match, score = await face_engine.validate_face(content, list(student.face_templates))
+            except Overloaded as e:
+                return _outcome("overloaded", _overloaded_response(e))
+            except ImageQualityError as e:
+                # e.reason: no_face, face_too_small, too_dark, too_bright, blurry
+                return _outcome(e.reason, claim.finish({"status": "gagal", "message": f"Foto ditolak: {e}", "data": None}, active_session.id, session_end))
             confidence_score = score
             
             if not is_match:
-                 return {"status": "gagal", "message": f"Wajah tidak cocok! (Skor: {score:.2f})", "data": None}
+                 return _outcome("mismatch", claim.finish({"status": "gagal", "message": f"Wajah tidak cocok! (Skor: {score:.2f})", "data": None}, active_session.id, session_end))
             
             # Additional strict check requested by user
-            if score < 0.8:
-                 return {"status": "gagal", "message": f"Akurasi Wajah Kurang (Skor: {score:.2f} < 0.8). Coba foto lebih jelas.", "data": None}
+            if score < MIN_FACE_SCORE:
+                 return _outcome("low_score", claim.finish({"status": "gagal", "message": f"Akurasi Wajah Kurang (Skor: {score:.2f} < {MIN_FACE_SCORE}). Coba foto lebih jelas.", "data": None}, active_session.id, session_end))
         else:
-            return {"status": "gagal", "message": "Data wajah siswa belum terdaftar", "data": None}
-
-    # 5. Simpan Bukti Foto
-    file_ext = file.filename.split(".")[-1]
-    filename = f"{uuid.uuid4()}.{file_ext}"
-    image_dir = "assets/attendance_images"
-    os.makedirs(image_dir, exist_ok=True)
-    file_path = os.path.join(image_dir, filename)
-    
-    with open(file_path, "wb") as f:
-        f.write(content)
-
-    # 6. Simpan Data Absensi ke Database
-    new_attendance = models.Attendance(
-        student_id=student.id,
-        date=today_str,
-        timestamp=now,
-        status="Hadir",
-        session_id=active_session.id, # Link ke sesi aktif
-        method=method,
-        confidence_score=confidence_score,
-        image_path=file_path
+            return _outcome("not_enrolled", {"status": "gagal", "message": "Data wajah siswa belum terdaftar", "data": None})
+
+    # 5. Simpan Data Absensi ke Database (image_path = hash foto, lihat evidence_store)
+    new_attendance = await _record_attendance(
+        _new_job(student.id, active_session, method, confidence_score, photo_hash, now)
     )
-    db.add(new_attendance)
-    db.commit()
-    db.refresh(new_attendance)
-    
+    if new_attendance is None:
+        return _outcome("duplicate", {"status": "gagal", "message": "Siswa sudah melakukan absensi di sesi ini.", "data": None})
+
+    # 6. Simpan Bukti Foto (setelah response dikirim)
+    background_tasks.add_task(evidence_store.save, photo_hash, content)
+
+    return _outcome("match", claim.finish({"status": "berhasil", "message": "Absensi berhasil dicatat", "data": new_attendance}, active_session.id, session_end))
+
+
+@router.post("/identify", response_model=schemas.AttendanceResponse)
+async def identify_attendance(
+    background_tasks: BackgroundTasks,
+    class_id: int = Form(...),
+    file: UploadFile = File(...),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    1:N attendance: client only sends class_id + photo, the server finds
+    the student among all enrolled members of the class.
+    """
+    now = datetime.now()
+    active_session = await db.run_sync(admission_cache.get_active_session, class_id, now)
+    if not active_session:
+        return _no_active_session_response()
+
+    if active_session.method != "face":
+        return {"status": "gagal", "message": f"Metode absensi salah! Sesi ini mengharuskan metode: {active_session.method}", "data": None}
+
+    gallery = await db.run_sync(gallery_cache.get, class_id)
+    if len(gallery) == 0:
+        return {"status": "gagal", "message": "Belum ada data wajah terdaftar di kelas ini", "data": None}
+    await db.close()  # Don't hold a pooled connection during face inference
+
+    content = await read_upload(file)
+    try:
+        async with face_admission.slot():
+            encoding = embedding_codec.decode(await face_engine.get_face_encoding(content))
+    except Overloaded as e:
+        return _overloaded_response(e)
+    except ImageQualityError as e:
+        return {"status": "gagal", "message": f"Foto ditolak: {e}", "data": None}
+    if encoding is None:
+        return {"status": "gagal", "message": "Wajah tidak terdeteksi", "data": None}
+
+    match = gallery.best_match(encoding)
+    if match is None:
+        return {"status": "gagal", "message": "Wajah tidak dikenali di kelas ini", "data": None}
+
+    student_id, distance = match
+    score = max(0.0, 1.0 - distance)
+    if score < MIN_FACE_SCORE:
+        return {"status": "gagal", "message": f"Akurasi Wajah Kurang (Skor: {score:.2f} < {MIN_FACE_SCORE}). Coba foto lebih jelas.", "data": None}
+
+    if await db.run_sync(admission_cache.has_attended, active_session.id, student_id):
+        return {"status": "gagal", "message": "Siswa sudah melakukan absensi di sesi ini.", "data": None}
+
+    file_path = evidence_store.content_hash(content)
+    new_attendance = await _record_attendance(_new_job(student_id, active_session, "face", score, file_path, now))
+    if new_attendance is None:
+        return {"status": "gagal", "message": "Siswa sudah melakukan absensi di sesi ini.", "data": None}
+    background_tasks.add_task(evidence_store.save, file_path, content)
+
     return {"status": "berhasil", "message": "Absensi berhasil dicatat", "data": new_attendance}
 
 
+@router.post("/group", response_model=schemas.GroupAttendanceResponse)
+async def group_attendance(
+    background_tasks: BackgroundTasks,
+    class_id: int = Form(...),
+    file: UploadFile = File(...),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Classroom photo attendance: every recognized face in one photo is marked
+    present for the active session, all rows written in a single transaction.
+    """
+    now = datetime.now()
+    active_session = await db.run_sync(admission_cache.get_active_session, class_id, now)
+    if not active_session:
+        return _no_active_session_response()
+
+    if active_session.method != "face":
+        return {"status": "gagal", "message": f"Metode absensi salah! Sesi ini mengharuskan metode: {active_session.method}"}
+
+    gallery = await db.run_sync(gallery_cache.get, class_id)
+    if len(gallery) == 0:
+        return {"status": "gagal", "message": "Belum ada data wajah terdaftar di kelas ini"}
+    await db.close()  # Don't hold a pooled connection during face inference
+
+    content = await read_upload(file)
+    try:
+        async with face_admission.slot():
+            faces = await face_engine.get_face_encodings(content)
+    except Overloaded as e:
+        return _overloaded_response(e)
+    except ImageQualityError as e:
+        return {"status": "gagal", "message": f"Foto ditolak: {e}"}
+    if not faces:
+        return {"status": "gagal", "message": "Tidak ada wajah terdeteksi di foto"}
+
+    encodings = [embedding_codec.decode(encoding_bytes) for _, encoding_bytes in faces]
+    matches = gallery.match_many(encodings)
+
+    matched_ids = [m[0] for m in matches if m is not None]
+    students = {
+        s.id: s for s in (await db.scalars(select(models.Student).where(models.Student.id.in_(matched_ids))))
+    }
+    already_attended = await db.run_sync(admission_cache.attended_students, active_session.id)
+
+    file_path = None
+    results = []
+    new_rows = []
+    for face_index, ((box, _), match) in enumerate(zip(faces, matches)):
+        result = schemas.GroupFaceResult(face_index=face_index, box=list(box), status="gagal", message="")
+        results.append(result)
+
+        if match is None:
+            result.message = "Wajah tidak dikenali di kelas ini"
+            continue
+
+        student_id, distance = match
+        student = students[student_id]
+        score = max(0.0, 1.0 - distance)
+        result.student_id = student.id
+        result.nim = student.nim
+        result.name = student.name
+        result.confidence_score = score
+
+        if score < MIN_FACE_SCORE:
+            result.message = f"Akurasi Wajah Kurang (Skor: {score:.2f} < {MIN_FACE_SCORE})"
+            continue
+        if student_id in already_attended:
+            result.message = "Siswa sudah melakukan absensi di sesi ini."
+            continue
+
+        if file_path is None:
+            file_path = evidence_store.content_hash(content)
+        new_rows.append(_new_job(student_id, active_session, "face", score, file_path, now).to_model())
+        result.status = "berhasil"
+        result.message = "Absensi berhasil dicatat"
+
+    if new_rows:
+        db.add_all(new_rows)
+        try:
+            await db.run_sync(rollup.record_attendance, class_id, [row.student_id for row in new_rows], now)
+            await db.commit()
+        except IntegrityError:
+            # Someone in the photo checked in on their own meanwhile; the cached set is stale
+            await db.rollback()
+            admission_cache.invalidate_sessions(class_id, active_session.id)
+            return {"status": "gagal", "message": "Data absensi berubah saat diproses, silakan kirim ulang foto."}
+        admission_cache.mark_attended(active_session.id, [row.student_id for row in new_rows])
+        background_tasks.add_task(evidence_store.save, file_path, content)
+
+    return {
+        "status": "berhasil" if new_rows else "gagal",
+        "message": f"{len(new_rows)} dari {len(faces)} wajah tercatat hadir",
+        "session_id": active_session.id,
+        "total_faces": len(faces),
+        "recorded": len(new_rows),
+        "results": results
+    }
+
+
 @router.get("/", response_model=list[schemas.Attendance])
 def read_attendance(
+    response: Response,
     skip: int = 0, 
     limit: int = 100, 
+    after_id: Optional[int] = None,
     student_id: Optional[int] = None,
     class_id: Optional[int] = None,
     db: Session = Depends(get_db)
 ):
-    query = db.query(models.Attendance)
+    """
+    Keyset pagination: pass the X-Next-Cursor header of the previous page as after_id.
+    skip (offset) still works but gets slower the deeper the page.
+    """
+    query = db.query(models.Attendance).order_by(models.Attendance.id)
 
     # Filter by Student ID
     if student_id:
@@ -190,4 +429,67 @@ def read_attendance(
     if class_id:
         query = query.join(models.Student).filter(models.Student.class_id == class_id)
 
-    return query.offset(skip).limit(limit).all()
+    if after_id is not None:
+        query = query.filter(models.Attendance.id > after_id)
+    elif skip:
+        query = query.offset(skip)
+
+    rows = query.limit(limit).all()
+    if rows and len(rows) == limit:
+        response.headers["X-Next-Cursor"] = str(rows[-1].id)
+    return rows
+
+@router.get("/export")
+def export_attendance(
+    format: str = "csv",
+    class_id: Optional[int] = None,
+    session_id: Optional[int] = None,
+    date_from: Optional[str] = None, # YYYY-MM-DD, inclusive
+    date_to: Optional[str] = None,
+):
+    """
+    Streams every matching attendance as CSV or NDJSON (constant memory).
+    class_id filters on the class of the attendance's session.
+    """
+    query = (
+        select(
+            models.Attendance.id,
+            models.Attendance.student_id,
+            models.Student.nim,
+            models.Student.name,
+            models.AttendanceSession.class_id,
+            models.Attendance.session_id,
+            models.Attendance.date,
+            models.Attendance.timestamp,
+            models.Attendance.status,
+            models.Attendance.method,
+            models.Attendance.confidence_score,
+        )
+        .join(models.Student, models.Student.id == models.Attendance.student_id)
+        .outerjoin(models.AttendanceSession, models.AttendanceSession.id == models.Attendance.session_id)
+        .order_by(models.Attendance.id)
+    )
+    if class_id is not None:
+        query = query.where(models.AttendanceSession.class_id == class_id)
+    if session_id is not None:
+        query = query.where(models.Attendance.session_id == session_id)
+    if date_from:
+        query = query.where(models.Attendance.date >= date_from)
+    if date_to:
+        query = query.where(models.Attendance.date <= date_to)
+    return export_response(query, format, "attendance")
+
+@router.get("/{attendance_id}/thumbnail")
+def get_attendance_thumbnail(attendance_id: int, db: Session = Depends(get_db)):
+    """
+    Small evidence thumbnail for the review UI (originals are never loaded).
+    """
+    attendance = db.query(models.Attendance).filter(models.Attendance.id == attendance_id).first()
+    if not attendance:
+        raise HTTPException(status_code=404, detail="Attendance not found")
+
+    path = evidence_store.resolve(attendance.image_path, thumbnail=True)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Evidence image not available")
+    # Evidence is content-addressed and never changes once written
+    return FileResponse(path, media_type="image/jpeg", headers={"Cache-Control": "private, max-age=86400"})
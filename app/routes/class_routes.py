@@ -2,6 +2,10 @@ from fastapi import APIRouter, Depends, HTTPException, Form
 from sqlalchemy.orm import Session
 from app.database import SessionLocal
 from app import models, schemas
+from app.utils.admission_cache import admission_cache
+from app.utils.face_gallery import gallery_cache
+from app.utils.report_cache import mark_dirty
+from app.utils import rollup
 from typing import List
 
 router = APIRouter(prefix="/classes", tags=["classes"])
@@ -53,8 +57,15 @@ def add_student_to_class(class_id: int, student_id: int, db: Session = Depends(g
 
     new_member = models.ClassMember(class_id=class_id, student_id=student_id)
     db.add(new_member)
+    db.flush()
+    rollup.ensure_rows(db, class_id=class_id, student_id=student_id)
+    # ensure_rows only marks rows it creates; a rollup row from the legacy Student.class_id
+    # already exists, but the class report still gains a member
+    mark_dirty(db, class_ids=[class_id], student_ids=[student_id])
     db.commit()
     db.refresh(new_member)
+    gallery_cache.invalidate(class_id)
+    admission_cache.invalidate_members(class_id)
     return new_member
 
 @router.get("/{class_id}/students", response_model=List[schemas.Student])
@@ -0,0 +1,48 @@
+import hmac
+import os
+import re
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import FileResponse
+from app import config
+from app.utils.profiling import profiler
+from typing import Optional
+
+router = APIRouter(prefix="/debug/profile", tags=["debug"])
+
+REPORT_FILE_PATTERN = re.compile(r"^[0-9]{8}-[0-9]{6}-[0-9a-f]{6}\.(txt|prof|collapsed)$")
+
+def require_profiling_token(x_profile_token: Optional[str] = Header(None)):
+    # Without PROFILING_TOKEN the profiler does not exist (middleware not installed)
+    if not config.PROFILING_TOKEN:
+        raise HTTPException(status_code=404, detail="Profiling disabled")
+    if not x_profile_token or not hmac.compare_digest(x_profile_token, config.PROFILING_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid profiling token")
+
+@router.post("", dependencies=[Depends(require_profiling_token)])
+async def start_profile(path: str = "/", count: int = 10, method: Optional[str] = None):
+    """
+    Profiles the next `count` requests whose path starts with `path`
+    (optionally only `method`) and aggregates them into one report.
+    """
+    if not 1 <= count <= config.PROFILE_MAX_REQUESTS:
+        raise HTTPException(status_code=400, detail=f"count must be between 1 and {config.PROFILE_MAX_REQUESTS}")
+    profiler.arm(path, count, method)
+    return profiler.status()
+
+@router.get("", dependencies=[Depends(require_profiling_token)])
+async def read_profile_status():
+    return profiler.status()
+
+@router.delete("", dependencies=[Depends(require_profiling_token)])
+async def stop_profile():
+    # Writes a report for the requests captured so far
+    report = await profiler.disarm()
+    return {"report": report, **profiler.status()}
+
+@router.get("/{file_name}", dependencies=[Depends(require_profiling_token)])
+async def read_profile_report(file_name: str):
+    path = os.path.join(config.PROFILE_DIR, file_name)
+    if not REPORT_FILE_PATTERN.match(file_name) or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Report not found")
+    media_type = "application/octet-stream" if file_name.endswith(".prof") else "text/plain"
+    return FileResponse(path, media_type=media_type, filename=file_name)
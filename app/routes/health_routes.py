@@ -1,7 +1,43 @@
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse, PlainTextResponse
+from app.utils import metrics
+from app.utils.admission import face_admission
+from app.utils.face_engine import face_engine
+from app.utils.idempotency import idempotency_cache
 
 router = APIRouter()
 
 @router.get("/")
 def read_root():
     return {"message": "Project Backend Smart Presence dimulai"}
+
+@router.get("/ready")
+def read_ready():
+    # Load balancer probe: 503 until every face worker has loaded and warmed up its models
+    status = face_engine.status()
+    if not status["ready"]:
+        return JSONResponse(status_code=503, content=status)
+    return status
+
+@router.get("/admission")
+def read_admission():
+    # Face verification limiter: slots in use, queue depth, waits and rejections
+    return face_admission.stats()
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def read_metrics():
+    # Prometheus scrape target: stage latency histograms, outcome counters, limiter gauges and totals
+    admission = face_admission.stats()
+    gauges = {
+        "presence_admission_active": ("Face verifications running now.", admission["active"]),
+        "presence_admission_queue_depth": ("Requests waiting for a face verification slot.", admission["queue_depth"]),
+    }
+    counters = {
+        "presence_admission_rejected_total": (
+            "Requests shed by the limiter (queue full or wait timeout).",
+            admission["rejected_queue_full"] + admission["rejected_timeout"],
+        ),
+        "presence_idempotent_replays_total": ("Retried submissions answered from the idempotency cache.", idempotency_cache.hits),
+    }
+    return PlainTextResponse(metrics.render(gauges, counters), media_type="text/plain; version=0.0.4")
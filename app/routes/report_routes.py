@@ -1,9 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import Response
 from sqlalchemy.orm import Session
 from app.database import SessionLocal
 from app import models, schemas
-from typing import List
-from datetime import datetime
+from app.utils.report_cache import report_cache, CachedReport
+from app.utils.report_service import build_class_report, build_student_report
 
 router = APIRouter(prefix="/reports", tags=["reports"])
 
@@ -14,61 +15,41 @@ def get_db():
     finally:
         db.close()
 
+def _cached_response(request: Request, report: CachedReport) -> Response:
+    # Dashboards poll these endpoints: unchanged reports cost a 304 and no DB work
+    headers = {"ETag": report.etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == report.etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=report.body, media_type="application/json", headers=headers)
+
 @router.get("/class/{class_id}", response_model=schemas.ClassReport)
-def get_class_report(class_id: int, db: Session = Depends(get_db)):
+def get_class_report(class_id: int, request: Request, db: Session = Depends(get_db)):
+    cache_key = ("class", class_id)
+    cached = report_cache.get(cache_key)
+    if cached:
+        return _cached_response(request, cached)
+
+    generation = report_cache.generation()
     class_obj = db.query(models.Class).filter(models.Class.id == class_id).first()
     if not class_obj:
         raise HTTPException(status_code=404, detail="Class not found")
 
-    today = datetime.now()
-    
-    # Count sessions that are active AND have passed (or all active sessions? usually all active)
-    # Filter by is_active=True to exclude deleted sessions
-    total_sessions_count = db.query(models.AttendanceSession).filter(
-        models.AttendanceSession.class_id == class_id,
-        models.AttendanceSession.is_active == True
-    ).count()
-
-    # Get all students in the class via ClassMember (or direct foreign key for simplicity if legacy)
-    # Using ClassMember is better as we migrated to it.
-    members = db.query(models.ClassMember).filter(models.ClassMember.class_id == class_id).all()
-    student_ids = [m.student_id for m in members]
-    students = db.query(models.Student).filter(models.Student.id.in_(student_ids)).all()
-
-    student_reports = []
-    for student in students:
-        # Count present
-        total_present = db.query(models.Attendance).filter(
-            models.Attendance.student_id == student.id,
-            models.Attendance.status == "Hadir" # Ensure we only count 'Hadir'
-        ).count()
-
-        total_alpha = total_sessions_count - total_present
-        if total_alpha < 0: total_alpha = 0 # Safety net
-
-        percentage = 0.0
-        if total_sessions_count > 0:
-            percentage = (total_present / total_sessions_count) * 100
-
-        student_reports.append(schemas.StudentReport(
-            student_id=student.id,
-            name=student.name,
-            nim=student.nim,
-            total_sessions=total_sessions_count,
-            total_present=total_present,
-            total_alpha=total_alpha,
-            attendance_percentage=round(percentage, 2)
-        ))
-
-    return schemas.ClassReport(
-        class_id=class_id,
-        class_name=class_obj.name,
-        total_sessions=total_sessions_count,
-        students=student_reports
+    report = build_class_report(db, class_obj)
+    cached = report_cache.put(
+        cache_key,
+        report.model_dump_json().encode(),
+        deps=[("class", class_id)] + [("student", s.student_id) for s in report.students],
+        generation=generation
     )
+    return _cached_response(request, cached)
+
+@router.get("/student/{student_identifier}", response_model=schemas.StudentDetailReport)
+def get_student_report(student_identifier: str, request: Request, db: Session = Depends(get_db)):
+    cache_key = ("student", student_identifier)
+    cached = report_cache.get(cache_key)
+    if cached:
+        return _cached_response(request, cached)
 
-@router.get("/student/{student_identifier}", response_model=schemas.StudentReport)
-def get_student_report(student_identifier: str, db: Session = Depends(get_db)):
     # Try finding by ID first if it looks like an integer and is small enough to be a reasonable ID
     student = None
     if student_identifier.isdigit() and len(student_identifier) < 10:
@@ -81,37 +62,14 @@ def get_student_report(student_identifier: str, db: Session = Depends(get_db)):
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
 
-    # Determine class from membership (assuming single class for simplicity in report context)
-    # Or use student.class_id if legacy field is still reliable/primary.
-    # We'll rely on the student.class_id as primary class for now, or find the main class.
-    # Let's check where the student is currently enrolled (Main Class)
-    current_class_id = student.class_id 
-    
-    total_sessions_count = 0
-    if current_class_id:
-        total_sessions_count = db.query(models.AttendanceSession).filter(
-            models.AttendanceSession.class_id == current_class_id,
-            models.AttendanceSession.is_active == True
-        ).count()
-
-    total_present = db.query(models.Attendance).filter(
-        models.Attendance.student_id == student.id,
-        models.Attendance.status == "Hadir"
-    ).count()
-
-    total_alpha = total_sessions_count - total_present
-    if total_alpha < 0: total_alpha = 0
-
-    percentage = 0.0
-    if total_sessions_count > 0:
-        percentage = (total_present / total_sessions_count) * 100
+    generation = report_cache.generation()
 
-    return schemas.StudentReport(
-        student_id=student.id,
-        name=student.name,
-        nim=student.nim,
-        total_sessions=total_sessions_count,
-        total_present=total_present,
-        total_alpha=total_alpha,
-        attendance_percentage=round(percentage, 2)
+    # Totals over every class the student belongs to, plus a per-class breakdown
+    report = build_student_report(db, student)
+    cached = report_cache.put(
+        cache_key,
+        report.model_dump_json().encode(),
+        deps=[("student", student.id)] + [("class", c.class_id) for c in report.classes],
+        generation=generation
     )
+    return _cached_response(request, cached)
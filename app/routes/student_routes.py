@@ -1,8 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Response, UploadFile, File, Form
+from sqlalchemy import exists, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.database import SessionLocal, engine
-from app import models, schemas
-from app.utils.ai_service import get_face_encoding
+from app.database import SessionLocal, engine, get_async_db
+from app import config, models, schemas
+from app.utils.ai_service import ImageQualityError
+from app.utils.face_engine import face_engine
+from app.utils.admission_cache import admission_cache
+from app.utils.face_gallery import gallery_cache
+from app.utils.embedding_store import embedding_store
+from app.utils import embedding_codec, rollup
+from app.utils.uploads import read_upload
+from app.utils.export import export_response
+from typing import Optional
 import shutil
 import os
 
@@ -18,22 +28,27 @@ def get_db():
 
 @router.post("/", response_model=schemas.Student)
 async def create_student(
+    background_tasks: BackgroundTasks,
     name: str = Form(...),
     nim: str = Form(...),
     class_id: int = Form(...),
     file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     # Check if student exists
-    db_student = db.query(models.Student).filter(models.Student.nim == nim).first()
+    db_student = (await db.scalars(select(models.Student).where(models.Student.nim == nim))).first()
     if db_student:
         raise HTTPException(status_code=400, detail="NIM already registered")
+    await db.close()  # Don't hold a pooled connection during face encoding
 
     # Read image content
-    content = await file.read()
+    content = await read_upload(file)
     
     # Generate face encoding
-    encoding = get_face_encoding(content)
+    try:
+        encoding = await face_engine.get_face_encoding(content)
+    except ImageQualityError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     if encoding is None:
         raise HTTPException(status_code=400, detail="No face detected in the photo")
 
@@ -45,15 +60,92 @@ async def create_student(
         face_encoding=encoding
     )
     db.add(new_student)
-    db.commit()
-    db.refresh(new_student)
+    await db.flush()
+    await db.run_sync(rollup.ensure_rows, class_id=class_id, student_id=new_student.id)
+    await db.commit()
+    gallery_cache.invalidate(class_id)
+    admission_cache.invalidate_student(nim)
+    background_tasks.add_task(embedding_store.request_export)
     return new_student
 
+@router.post("/{student_id}/templates", response_model=schemas.FaceTemplate)
+async def add_face_template(
+    background_tasks: BackgroundTasks,
+    student_id: int,
+    file: UploadFile = File(...),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Enrolls one more photo of the student. Verification compares against all
+    templates, so one bad enrollment photo no longer causes retakes.
+    """
+    student = await db.get(models.Student, student_id)
+    if not student:
+        raise HTTPException(status_code=404, detail="Student not found")
+
+    template_count = await db.scalar(
+        select(func.count(models.FaceTemplate.id)).where(models.FaceTemplate.student_id == student_id)
+    )
+    if student.face_encoding:
+        template_count += 1
+    if template_count >= config.MAX_FACE_TEMPLATES:
+        raise HTTPException(status_code=400, detail=f"Maximum {config.MAX_FACE_TEMPLATES} face templates per student")
+    await db.close()  # Don't hold a pooled connection during face encoding
+
+    content = await read_upload(file)
+    try:
+        encoding = await face_engine.get_face_encoding(content)
+    except ImageQualityError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if encoding is None:
+        raise HTTPException(status_code=400, detail="No face detected in the photo")
+    if embedding_codec.decode(encoding) is None:
+        raise HTTPException(status_code=400, detail="Face templates need the face_recognition backend (AI LITE mode active)")
+
+    template = models.FaceTemplate(student_id=student_id, embedding=encoding)
+    db.add(template)
+    await db.commit()
+    # The student may be in several classes
+    gallery_cache.invalidate()
+    admission_cache.invalidate_student(student.nim)
+    background_tasks.add_task(embedding_store.request_export)
+    return template
+
 @router.get("/", response_model=list[schemas.Student])
-def read_students(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    students = db.query(models.Student).offset(skip).limit(limit).all()
+def read_students(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    after_id: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    # Keyset pagination: after_id = X-Next-Cursor of the previous page (skip kept for old clients)
+    query = db.query(models.Student).order_by(models.Student.id)
+    if after_id is not None:
+        query = query.filter(models.Student.id > after_id)
+    elif skip:
+        query = query.offset(skip)
+
+    students = query.limit(limit).all()
+    if students and len(students) == limit:
+        response.headers["X-Next-Cursor"] = str(students[-1].id)
     return students
 
+@router.get("/export")
+def export_students(format: str = "csv", class_id: Optional[int] = None):
+    """
+    Streams all students (without face encodings) as CSV or NDJSON.
+    class_id matches class members as well as the legacy Student.class_id.
+    """
+    query = select(models.Student.id, models.Student.nim, models.Student.name, models.Student.class_id).order_by(models.Student.id)
+    if class_id is not None:
+        is_member = exists().where(
+            models.ClassMember.class_id == class_id,
+            models.ClassMember.student_id == models.Student.id
+        )
+        query = query.where(or_(models.Student.class_id == class_id, is_member))
+    return export_response(query, format, "students")
+
 @router.post("/classes/", response_model=schemas.Class)
 def create_class(class_data: schemas.ClassCreate, db: Session = Depends(get_db)):
     db_class = models.Class(name=class_data.name)
@@ -28,6 +28,14 @@ class Student(StudentBase):
     class Config:
         from_attributes = True
 
+class FaceTemplate(BaseModel):
+    id: int
+    student_id: int
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
 class AttendanceBase(BaseModel):
     student_id: int
 
@@ -48,6 +56,24 @@ class AttendanceResponse(BaseModel):
     message: str
     data: Optional[Attendance] = None
 
+class GroupFaceResult(BaseModel):
+    face_index: int
+    box: List[int] # top, right, bottom, left
+    status: str
+    message: str
+    student_id: Optional[int] = None
+    nim: Optional[str] = None
+    name: Optional[str] = None
+    confidence_score: float = 0.0
+
+class GroupAttendanceResponse(BaseModel):
+    status: str
+    message: str
+    session_id: Optional[int] = None
+    total_faces: int = 0
+    recorded: int = 0
+    results: List[GroupFaceResult] = []
+
 from pydantic import BaseModel, Field
 
 class AttendanceSessionBase(BaseModel):
@@ -93,6 +119,17 @@ class StudentReport(BaseModel):
     total_alpha: int
     attendance_percentage: float
 
+class ClassAttendanceSummary(BaseModel):
+    class_id: int
+    class_name: str
+    total_sessions: int
+    total_present: int
+    total_alpha: int
+    attendance_percentage: float
+
+class StudentDetailReport(StudentReport):
+    classes: List[ClassAttendanceSummary] = []
+
 class ClassReport(BaseModel):
     class_id: int
     class_name: str
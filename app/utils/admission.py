@@ -0,0 +1,110 @@
+"""
+Admission control for the face pipeline.
+
+At the start of a class far more check-ins arrive than the face workers can verify.
+Instead of letting every request wait until the client times out, at most
+max_concurrent verifications run at once, at most max_queue wait for a slot and
+none waits longer than max_wait seconds. Everything else is rejected right away
+with Overloaded, which the routes turn into 429 + Retry-After.
+
+Only the expensive stage goes through the limiter; the cheap rejections
+(unknown NIM, no session, duplicate) run before it.
+"""
+import asyncio
+import math
+import time
+from contextlib import asynccontextmanager
+
+from app import config
+from app.utils import metrics
+
+# Weight of the newest sample in the moving averages
+EWMA_ALPHA = 0.2
+
+
+class Overloaded(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__(f"Face verification saturated, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class AdmissionLimiter:
+    def __init__(
+        self,
+        max_concurrent: int = config.ADMISSION_MAX_CONCURRENT,
+        max_queue: int = config.ADMISSION_QUEUE_DEPTH,
+        max_wait: float = config.ADMISSION_MAX_WAIT_S,
+    ):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._semaphore = None
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+        self.avg_wait = 0.0
+        self.max_wait_seen = 0.0
+        self.avg_service = 1.0  # Seconds per verification, learned from traffic
+
+    def retry_after(self) -> int:
+        # Time until the current queue (plus this request) would drain
+        backlog = (self.waiting + 1) / self.max_concurrent * self.avg_service
+        return min(60, max(1, math.ceil(backlog)))
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # Created on first use, on the server's event loop: before Python 3.10 asyncio
+        # primitives bind to the loop current at construction (none at import time)
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        return self._semaphore
+
+    @asynccontextmanager
+    async def slot(self):
+        semaphore = self._get_semaphore()
+        if semaphore.locked() and self.waiting >= self.max_queue:
+            self.rejected_queue_full += 1
+            raise Overloaded(self.retry_after())
+
+        self.waiting += 1
+        queued_at = time.monotonic()
+        try:
+            await asyncio.wait_for(semaphore.acquire(), self.max_wait)
+        except asyncio.TimeoutError:
+            self.rejected_timeout += 1
+            raise Overloaded(self.retry_after())
+        finally:
+            self.waiting -= 1
+
+        wait = time.monotonic() - queued_at
+        metrics.stage_seconds.observe("queue_wait", wait)
+        self.avg_wait += EWMA_ALPHA * (wait - self.avg_wait)
+        self.max_wait_seen = max(self.max_wait_seen, wait)
+        self.admitted += 1
+        self.active += 1
+        started_at = time.monotonic()
+        try:
+            yield
+        finally:
+            self.active -= 1
+            semaphore.release()
+            self.avg_service += EWMA_ALPHA * (time.monotonic() - started_at - self.avg_service)
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "max_wait_s": self.max_wait,
+            "active": self.active,
+            "queue_depth": self.waiting,
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+            "avg_wait_ms": round(self.avg_wait * 1000, 1),
+            "max_wait_ms": round(self.max_wait_seen * 1000, 1),
+            "avg_service_ms": round(self.avg_service * 1000, 1),
+        }
+
+
+face_admission = AdmissionLimiter()
@@ -0,0 +1,162 @@
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from app import config, models
+
+_MISSING = object()
+
+
+@dataclass(frozen=True)
+class StudentEntry:
+    id: int
+    nim: str
+    class_id: Optional[int]
+    face_templates: tuple[bytes, ...] # Student.face_encoding first, then FaceTemplate rows
+
+
+@dataclass(frozen=True)
+class SessionEntry:
+    id: int
+    class_id: int
+    date: str
+    start_time: str
+    end_time: str
+    method: str
+
+
+class TTLCache:
+    """
+    Minimal thread-safe dict whose entries expire after ttl_seconds.
+    The TTL bounds staleness for changes made outside this process
+    (other uvicorn workers, generate_dataset.py, ...).
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._data: dict = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        item = self._data.get(key)
+        if item is None:
+            return _MISSING
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            self._data.pop(key, None)
+            return _MISSING
+        return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl_seconds, value)
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def pop_where(self, predicate):
+        with self._lock:
+            for key in [k for k in self._data if predicate(k)]:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class AdmissionCache:
+    """
+    In-process cache for the lookups submit_attendance does before any face work:
+    student by NIM, class membership, today's sessions of a class and who already
+    attended a session. Routes that change these rows call the invalidate_* hooks.
+    """
+
+    def __init__(self, ttl_seconds: float = config.ADMISSION_CACHE_TTL):
+        self.students = TTLCache(ttl_seconds)     # nim -> StudentEntry | None
+        self.members = TTLCache(ttl_seconds)      # class_id -> set(student_id)
+        self.sessions = TTLCache(ttl_seconds)     # (class_id, date) -> list[SessionEntry]
+        self.attended = TTLCache(ttl_seconds)     # session_id -> set(student_id)
+        self._lock = threading.Lock()
+
+    def get_student(self, db: Session, nim: str) -> Optional[StudentEntry]:
+        entry = self.students.get(nim)
+        if entry is _MISSING:
+            student = db.query(models.Student).filter(models.Student.nim == nim).first()
+            entry = None
+            if student:
+                extra = db.query(models.FaceTemplate.embedding).filter(
+                    models.FaceTemplate.student_id == student.id
+                ).order_by(models.FaceTemplate.id).all()
+                templates = ([student.face_encoding] if student.face_encoding else []) + [row.embedding for row in extra]
+                entry = StudentEntry(student.id, student.nim, student.class_id, tuple(templates))
+            # Unknown NIMs are cached too, so repeated typos never reach the DB
+            self.students.set(nim, entry)
+        return entry
+
+    def is_member(self, db: Session, class_id: int, student_id: int) -> bool:
+        members = self.members.get(class_id)
+        if members is _MISSING:
+            rows = db.query(models.ClassMember.student_id).filter(models.ClassMember.class_id == class_id).all()
+            members = {row.student_id for row in rows}
+            self.members.set(class_id, members)
+        return student_id in members
+
+    def get_active_session(self, db: Session, class_id: int, now: datetime) -> Optional[SessionEntry]:
+        today_str = now.strftime("%Y-%m-%d")
+        current_time_str = now.strftime("%H:%M")
+
+        sessions = self.sessions.get((class_id, today_str))
+        if sessions is _MISSING:
+            rows = db.query(models.AttendanceSession).filter(
+                models.AttendanceSession.class_id == class_id,
+                models.AttendanceSession.date == today_str,
+                models.AttendanceSession.is_active == True
+            ).order_by(models.AttendanceSession.id).all()
+            sessions = [
+                SessionEntry(s.id, s.class_id, s.date, s.start_time, s.end_time, s.method)
+                for s in rows
+            ]
+            self.sessions.set((class_id, today_str), sessions)
+
+        for session in sessions:
+            if session.start_time <= current_time_str <= session.end_time:
+                return session
+        return None
+
+    def attended_students(self, db: Session, session_id: int) -> set:
+        attended = self.attended.get(session_id)
+        if attended is _MISSING:
+            rows = db.query(models.Attendance.student_id).filter(models.Attendance.session_id == session_id).all()
+            attended = {row.student_id for row in rows}
+            self.attended.set(session_id, attended)
+        return attended
+
+    def has_attended(self, db: Session, session_id: int, student_id: int) -> bool:
+        return student_id in self.attended_students(db, session_id)
+
+    def mark_attended(self, session_id: int, student_ids):
+        attended = self.attended.get(session_id)
+        if attended is _MISSING:
+            return
+        with self._lock:
+            attended.update(student_ids)
+
+    def invalidate_student(self, nim: str):
+        self.students.pop(nim)
+
+    def invalidate_members(self, class_id: int):
+        self.members.pop(class_id)
+
+    def invalidate_sessions(self, class_id: int, session_id: Optional[int] = None):
+        # Drop every cached day of the class, not only today
+        self.sessions.pop_where(lambda key: key[0] == class_id)
+        if session_id is not None:
+            self.attended.pop(session_id)
+
+
+admission_cache = AdmissionCache()
@@ -1,51 +1,201 @@
-try:
-    import face_recognition
-    import numpy as np
-    import io
-    HAS_FACE_RECOGNITION = True
-except ImportError:
-    HAS_FACE_RECOGNITION = False
-    print("WARNING: 'face_recognition' library not found. Running in AI LITE mode (Face Detection Only).")
-    import cv2
-    import numpy as np
-    import io
-
-import pickle # ensure pickle is available for loading numpy array if needed or use frombuffer
-
-def validate_face(image_bytes: bytes, known_face_encoding_bytes: bytes) -> tuple[bool, float]:
-    """
-    Validates if the face in the image matches the known face encoding.
+"""
+Face inference path. The heavy libraries (face_recognition/dlib, NumPy, OpenCV, Pillow)
+are imported lazily by registry.load(), so importing this module - and therefore the
+API - stays cheap. Only processes that actually run inference pay for them.
+"""
+from __future__ import annotations
+
+import io
+import os
+import threading
+import time
+from contextlib import contextmanager
+from app import config
+from app.utils import embedding_codec
+
+# Filled in by _import_libraries()
+face_recognition = None
+np = None
+cv2 = None
+Image = None
+ImageOps = None
+HAS_FACE_RECOGNITION = None
+
+def _import_libraries():
+    global face_recognition, np, cv2, Image, ImageOps, HAS_FACE_RECOGNITION
+    if HAS_FACE_RECOGNITION is not None:
+        return
+
+    import numpy
+    from PIL import Image as pil_image, ImageOps as pil_image_ops
+    np, Image, ImageOps = numpy, pil_image, pil_image_ops
+
+    try:
+        import face_recognition as fr
+        face_recognition = fr
+        HAS_FACE_RECOGNITION = True
+    except ImportError:
+        print("WARNING: 'face_recognition' library not found. Running in AI LITE mode (Face Detection Only).")
+        import cv2 as opencv
+        cv2 = opencv
+        HAS_FACE_RECOGNITION = False
+
+# Extra space kept around a detected face when cropping it for the encoder
+FACE_CROP_MARGIN = 0.25
+
+class ImageQualityError(Exception):
+    """
+    Raised by the quality gate when a photo is unusable (dark, blurry, no face, face too small).
+    The message is the user-facing reason, `reason` a short code for metrics.
+    """
+
+    def __init__(self, message: str, reason: str = "quality"):
+        super().__init__(message)
+        self.reason = reason
+
+    def __reduce__(self):
+        # Keeps `reason` when the error is sent back from a face worker process
+        return (ImageQualityError, (str(self), self.reason))
+
+# Per-stage timings of the call currently running in this thread, see run_timed()
+_timings = threading.local()
+
+@contextmanager
+def _stage(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stages = getattr(_timings, "stages", None)
+        if stages is not None:
+            stages[name] = stages.get(name, 0.0) + time.perf_counter() - start
+
+def run_timed(fn, *args):
+    """
+    Runs one of the functions below and also returns how long each stage took
+    (decode, quality, detection, encoding, distance), so face_engine can record
+    worker-side timings in the API process.
+    Returns (result, quality_error, timings); quality_error is the ImageQualityError
+    raised by fn, if any, and result is None then.
+    """
+    _timings.stages = {}
+    try:
+        return fn(*args), None, _timings.stages
+    except ImageQualityError as e:
+        return None, e, _timings.stages
+    finally:
+        _timings.stages = None
+
+class ModelRegistry:
+    """
+    Holds every detector/encoder of this process. Models are loaded and warmed up
+    once (at worker startup) and reused by all requests afterwards.
+    """
+
+    def __init__(self):
+        self.backend = None
+        self.loaded = False
+        self.warm = False
+        self.load_ms = None
+        self.warmup_ms = None
+        self._face_cascade = None
+        self._lock = threading.Lock()
+
+    @property
+    def face_cascade(self):
+        self.load()
+        return self._face_cascade
+
+    def load(self):
+        if self.loaded:
+            return
+        with self._lock:
+            if self.loaded:
+                return
+            start = time.perf_counter()
+            _import_libraries()
+            self.backend = "face_recognition" if HAS_FACE_RECOGNITION else "opencv-lite"
+            if HAS_FACE_RECOGNITION:
+                # face_recognition builds its dlib detector, landmark and encoder models on import;
+                # touching them here makes sure they are in memory before the first request.
+                api = face_recognition.api
+                _ = (api.face_detector, api.pose_predictor_5_point, api.face_encoder)
+            else:
+                # Load Haarcascade (included in opencv-python)
+                self._face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+                if self._face_cascade.empty():
+                    raise RuntimeError("Failed to load OpenCV Haarcascade")
+            self.load_ms = (time.perf_counter() - start) * 1000
+            self.loaded = True
+
+    def warm_up(self):
+        """
+        Loads the models and runs one dummy inference so lazy allocations
+        happen now instead of during the first attendance.
+        """
+        self.load()
+        start = time.perf_counter()
+
+        dummy = np.zeros((160, 160, 3), dtype=np.uint8)
+        dummy[40:120, 40:120] = 200
+        if HAS_FACE_RECOGNITION:
+            face_recognition.face_locations(dummy)
+            face_recognition.face_encodings(dummy, known_face_locations=[(40, 120, 120, 40)])
+        else:
+            self._face_cascade.detectMultiScale(cv2.cvtColor(dummy, cv2.COLOR_RGB2GRAY), 1.1, 4)
+
+        self.warmup_ms = (time.perf_counter() - start) * 1000
+        self.warm = True
+        print(f"AI models ready ({self.backend}): load {self.load_ms:.0f} ms, warm-up {self.warmup_ms:.0f} ms")
+
+    def status(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "backend": self.backend,
+            "loaded": self.loaded,
+            "warm": self.warm,
+            "load_ms": self.load_ms,
+            "warmup_ms": self.warmup_ms,
+        }
+
+registry = ModelRegistry()
+
+def validate_face(image_bytes: bytes, known_templates: list[bytes]) -> tuple[bool, float]:
+    """
+    Validates if the face in the image matches the student's enrollment templates
+    (embedding_codec blobs; best or mean template, see config.FACE_TEMPLATE_MATCHING).
     Returns: (is_match, confidence_score)
+    Raises ImageQualityError if the photo is rejected by the quality gate.
     """
+    registry.load()
     if HAS_FACE_RECOGNITION:
         try:
-            image = face_recognition.load_image_file(io.BytesIO(image_bytes))
-            face_encodings = face_recognition.face_encodings(image)
-            
-            if not face_encodings:
-                print("No face found in the uploaded image.")
-                return False, 0.0
-
-            unknown_face_encoding = face_encodings[0]
-            known_face_encoding = np.frombuffer(known_face_encoding_bytes, dtype=np.float64)
+            unknown_face_encoding = _encode_single_face(image_bytes)
 
             # Calculate distance
-            face_distances = face_recognition.face_distance([known_face_encoding], unknown_face_encoding)
-            distance = face_distances[0]
-            
+            with _stage("distance"):
+                distance = embedding_codec.template_distance(
+                    unknown_face_encoding, [embedding_codec.decode(blob) for blob in known_templates]
+                )
+            if distance is None:
+                # Only LITE placeholders enrolled: nothing to compare with
+                return False, 0.0
+
             # Calculate score: 1.0 - distance
             # If distance > 1.0, score is 0.0
             score = max(0.0, 1.0 - distance)
-            
+
             # Strict match check (e.g. distance < 0.6)
             is_match = distance < 0.6
-            
+
             return is_match, float(score)
+        except ImageQualityError:
+            raise
         except Exception as e:
             print(f"Error in face validation: {e}")
             return False, 0.0
     else:
-        # Fallback: Use OpenCV just to detect IF there is a face, 
+        # Fallback: Use OpenCV just to detect IF there is a face,
         # but skip strict comparison (mock validation as True if face exists)
         is_face_detected = _detect_face_opencv(image_bytes)
         return is_face_detected, 0.9 if is_face_detected else 0.0
@@ -53,47 +203,163 @@ def validate_face(image_bytes: bytes, known_face_encoding_bytes: bytes) -> tuple
 def get_face_encoding(image_bytes: bytes) -> bytes:
     """
     Generates face encoding bytes from an image.
+    Raises ImageQualityError if the photo is rejected by the quality gate.
     """
+    registry.load()
     if HAS_FACE_RECOGNITION:
         try:
-            image = face_recognition.load_image_file(io.BytesIO(image_bytes))
-            face_encodings = face_recognition.face_encodings(image)
-            
-            if not face_encodings:
-                return None
-                
-            return face_encodings[0].tobytes()
+            return embedding_codec.encode(_encode_single_face(image_bytes))
+        except ImageQualityError:
+            raise
         except Exception as e:
             print(f"Error generating encoding: {e}")
             return None
     else:
-        # Fallback: Return a dummy byte string if face detected
+        # Fallback: no vector available, store the LITE marker if a face was detected
         if _detect_face_opencv(image_bytes):
-            return b"dummy_encoding_opencv_lite"
+            return embedding_codec.LITE_MARKER
         return None
 
+def get_face_encodings(image_bytes: bytes) -> list[tuple[tuple[int, int, int, int], bytes]]:
+    """
+    Encodes every face in the image (e.g. a classroom photo).
+    Returns a list of (box, embedding_codec blob) where box is (top, right, bottom, left)
+    in the coordinates of the original upload.
+    """
+    registry.load()
+    if HAS_FACE_RECOGNITION:
+        try:
+            image, scale = _decode_image(image_bytes, config.GROUP_PHOTO_MAX_DIMENSION)
+            _check_image_quality(image)
+            with _stage("detection"):
+                face_locations = face_recognition.face_locations(
+                    image, number_of_times_to_upsample=config.FACE_DETECTION_UPSAMPLE
+                )
+            if not face_locations:
+                return []
+
+            # Reuse the detected locations so the detector only runs once
+            with _stage("encoding"):
+                face_encodings = face_recognition.face_encodings(image, known_face_locations=face_locations)
+            return [
+                (tuple(int(v * scale) for v in location), embedding_codec.encode(encoding))
+                for location, encoding in zip(face_locations, face_encodings)
+            ]
+        except ImageQualityError:
+            raise
+        except Exception as e:
+            print(f"Error generating encodings: {e}")
+            return []
+    else:
+        # AI LITE mode cannot produce real encodings, so nobody can be identified
+        return []
+
+def _decode_image(image_bytes: bytes, max_dimension: int) -> tuple[np.ndarray, float]:
+    """
+    Preprocessing stage shared by enrollment and verification.
+    Decodes the upload once, downsized so its longest side is at most max_dimension.
+    JPEGs are decoded directly at a reduced size (1/2, 1/4 or 1/8) by libjpeg,
+    so a 12 MP phone photo never gets decoded at full resolution.
+    Returns (rgb_image, scale) where scale maps processed coordinates back to the original.
+    """
+    with _stage("decode"):
+        img = Image.open(io.BytesIO(image_bytes))
+        original_longest_side = max(img.size)
+
+        if img.format == "JPEG":
+            img.draft("RGB", (max_dimension, max_dimension))
+
+        # Phones store portrait photos rotated + an EXIF orientation tag
+        img = ImageOps.exif_transpose(img).convert("RGB")
+        img.thumbnail((max_dimension, max_dimension))
+
+        scale = original_longest_side / max(img.size)
+        return np.asarray(img), scale
+
+def _check_image_quality(image: np.ndarray):
+    """
+    Cheap checks (a few ms) that reject dark, overexposed or blurry photos
+    before any detector/encoder runs.
+    """
+    with _stage("quality"):
+        gray = image.mean(axis=2, dtype=np.float32)
+
+        brightness = float(gray.mean())
+        if brightness < config.FACE_MIN_BRIGHTNESS:
+            raise ImageQualityError("Foto terlalu gelap. Cari tempat yang lebih terang.", "too_dark")
+        if brightness > config.FACE_MAX_BRIGHTNESS:
+            raise ImageQualityError("Foto terlalu terang. Hindari cahaya langsung dari belakang/depan.", "too_bright")
+
+        # Variance of the Laplacian: low = few edges = blurry
+        laplacian = (
+            gray[:-2, 1:-1] + gray[2:, 1:-1] + gray[1:-1, :-2] + gray[1:-1, 2:]
+            - 4.0 * gray[1:-1, 1:-1]
+        )
+        if float(laplacian.var()) < config.FACE_MIN_SHARPNESS:
+            raise ImageQualityError("Foto buram. Pegang kamera dengan stabil dan coba lagi.", "blurry")
+
+def _crop_face(image: np.ndarray, location: tuple[int, int, int, int]) -> tuple[np.ndarray, tuple[int, int, int, int]]:
+    """
+    Cuts the face (plus FACE_CROP_MARGIN) out of the image.
+    Returns (crop, location_inside_crop).
+    """
+    top, right, bottom, left = location
+    margin_y = int((bottom - top) * FACE_CROP_MARGIN)
+    margin_x = int((right - left) * FACE_CROP_MARGIN)
+
+    y0 = max(0, top - margin_y)
+    y1 = min(image.shape[0], bottom + margin_y)
+    x0 = max(0, left - margin_x)
+    x1 = min(image.shape[1], right + margin_x)
+
+    crop = np.ascontiguousarray(image[y0:y1, x0:x1])
+    return crop, (top - y0, right - x0, bottom - y0, left - x0)
+
+def _encode_single_face(image_bytes: bytes):
+    """
+    Decode/downscale -> quality gate -> locate face -> encode only the crop of the largest face.
+    Returns the 128-d encoding. Raises ImageQualityError when the photo is rejected.
+    """
+    image, _ = _decode_image(image_bytes, config.FACE_MAX_DIMENSION)
+    _check_image_quality(image)
+
+    with _stage("detection"):
+        face_locations = face_recognition.face_locations(
+            image, number_of_times_to_upsample=config.FACE_DETECTION_UPSAMPLE
+        )
+    if not face_locations:
+        raise ImageQualityError("Wajah tidak terdeteksi di foto.", "no_face")
+
+    # Largest face = the person holding the phone
+    location = max(face_locations, key=lambda l: (l[2] - l[0]) * (l[1] - l[3]))
+    if location[2] - location[0] < config.FACE_MIN_SIZE:
+        raise ImageQualityError("Wajah terlalu kecil. Dekatkan kamera ke wajah.", "face_too_small")
+
+    with _stage("encoding"):
+        crop, crop_location = _crop_face(image, location)
+        face_encodings = face_recognition.face_encodings(crop, known_face_locations=[crop_location])
+    return face_encodings[0]
+
 def _detect_face_opencv(image_bytes: bytes) -> bool:
     """
     Simple face detection using OpenCV Haarcascades as fallback.
     """
     try:
-        # Convert bytes to numpy array
-        nparr = np.frombuffer(image_bytes, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        
-        # Load Haarcascade (included in opencv-python)
-        face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-        
-        faces = face_cascade.detectMultiScale(gray, 1.1, 4)
-        
+        image, _ = _decode_image(image_bytes, config.FACE_MAX_DIMENSION)
+        _check_image_quality(image)
+        gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+
+        with _stage("detection"):
+            faces = registry.face_cascade.detectMultiScale(gray, 1.1, 4)
+
         if len(faces) > 0:
             print(f"AI LITE: Detected {len(faces)} face(s). Verification bypassed (Success).")
             return True
         else:
             print("AI LITE: No face detected.")
             return False
+    except ImageQualityError:
+        raise
     except Exception as e:
         print(f"Error in OpenCV fallback: {e}")
         return False
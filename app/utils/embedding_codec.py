@@ -0,0 +1,84 @@
+"""
+Versioned binary format for face embeddings (Student.face_encoding, FaceTemplate.embedding).
+
+    header (7 bytes, little endian): b"FE", format version, model id, dtype code, dimension (uint16)
+    payload: dimension values of that dtype
+
+Blobs written before this format (raw float64 tobytes(), 1024 bytes) still decode.
+AI LITE mode cannot compute embeddings and stores LITE_MARKER, a header with
+MODEL_OPENCV_LITE and dimension 0, which decode() turns into None.
+Only imports app.config (it runs inside the face workers); NumPy is imported lazily.
+"""
+from __future__ import annotations
+
+import struct
+from typing import TYPE_CHECKING, Iterable, Optional
+
+from app import config
+
+if TYPE_CHECKING:
+    import numpy as np
+
+MAGIC = b"FE"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<2sBBBH")
+
+MODEL_DLIB_RESNET = 1   # face_recognition / dlib, 128-d
+MODEL_OPENCV_LITE = 2   # detection only, no vector
+
+DTYPES = {1: "float32", 2: "float16", 3: "float64"}
+DTYPE_CODES = {name: code for code, name in DTYPES.items()}
+
+LEGACY_DIM = 128
+LITE_MARKER = HEADER.pack(MAGIC, FORMAT_VERSION, MODEL_OPENCV_LITE, DTYPE_CODES["float32"], 0)
+
+
+def encode(vector, dtype: str = config.EMBEDDING_DTYPE, model: int = MODEL_DLIB_RESNET) -> bytes:
+    import numpy as np
+
+    values = np.asarray(vector, dtype=dtype)
+    return HEADER.pack(MAGIC, FORMAT_VERSION, model, DTYPE_CODES[dtype], values.shape[0]) + values.tobytes()
+
+
+def decode(blob: Optional[bytes]) -> Optional[np.ndarray]:
+    """
+    Returns the embedding (in its stored dtype, read-only view of the blob),
+    or None for LITE markers, legacy placeholders and unreadable blobs.
+    """
+    if not blob:
+        return None
+
+    import numpy as np
+
+    if blob[:2] != MAGIC:
+        if len(blob) == LEGACY_DIM * 8:
+            return np.frombuffer(blob, dtype=np.float64)
+        return None
+
+    if len(blob) < HEADER.size:
+        return None
+    _, version, model, dtype_code, dim = HEADER.unpack_from(blob)
+    if version != FORMAT_VERSION or model != MODEL_DLIB_RESNET or dtype_code not in DTYPES or dim == 0:
+        return None
+    dtype = np.dtype(DTYPES[dtype_code])
+    if len(blob) != HEADER.size + dim * dtype.itemsize:
+        return None
+    return np.frombuffer(blob, dtype=dtype, offset=HEADER.size)
+
+
+def template_distance(vector: np.ndarray, templates: Iterable[np.ndarray], mode: str = config.FACE_TEMPLATE_MATCHING) -> Optional[float]:
+    """
+    Distance between a probe embedding and a student's enrollment templates:
+    "best" = closest template, "mean" = distance to the templates' centroid.
+    None when there is no usable template.
+    """
+    import numpy as np
+
+    templates = [t for t in templates if t is not None]
+    if not templates:
+        return None
+    matrix = np.vstack(templates).astype(np.float32)
+    probe = np.asarray(vector, dtype=np.float32)
+    if mode == "mean":
+        return float(np.linalg.norm(matrix.mean(axis=0) - probe))
+    return float(np.linalg.norm(matrix - probe, axis=1).min())
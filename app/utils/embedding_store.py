@@ -0,0 +1,208 @@
+"""
+Memory-mapped embedding store shared by all API worker processes.
+
+Every enrollment template (Student.face_encoding + FaceTemplate) is exported to
+versioned .npy files that each worker maps read-only, so the OS page cache keeps
+one copy of the embeddings for all workers and a new worker maps them instantly:
+
+    EMBEDDING_STORE_DIR/CURRENT                    name of the live version
+    EMBEDDING_STORE_DIR/v<ns>/embeddings.npy       (n_templates, 128) in EMBEDDING_DTYPE
+    EMBEDDING_STORE_DIR/v<ns>/student_ids.npy      sorted student ids (the index)
+    EMBEDDING_STORE_DIR/v<ns>/offsets.npy          first template row of each student
+
+A version directory is complete before CURRENT is atomically replaced to point at it;
+workers notice the new CURRENT on their next gallery lookup and remap.
+Enrollments trigger request_export() as a background task.
+
+    python -m app.utils.embedding_store    # export now
+"""
+from __future__ import annotations
+
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import defaultdict
+from typing import Iterable, Iterator, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app import config, models
+from app.utils import embedding_codec
+
+KEEP_VERSIONS = 2
+EXPORT_BATCH_SIZE = 1000
+
+
+class EmbeddingSnapshot:
+    """
+    One mapped version of the store.
+    """
+
+    def __init__(self, version: str, path: str):
+        import numpy as np
+
+        self.version = version
+        self.embeddings = np.load(os.path.join(path, "embeddings.npy"), mmap_mode="r")
+        self.student_ids = np.load(os.path.join(path, "student_ids.npy"))
+        offsets = np.load(os.path.join(path, "offsets.npy"))
+        self._bounds = np.append(offsets, len(self.embeddings))
+
+    def __len__(self):
+        return len(self.student_ids)
+
+    def rows_for(self, student_ids: Iterable[int]) -> Iterator[tuple[int, int, int]]:
+        """
+        (student_id, first_row, end_row) of the requested students that are in this
+        version; their templates are embeddings[first_row:end_row].
+        """
+        import numpy as np
+
+        wanted = np.asarray(sorted(set(student_ids)), dtype=np.int64)
+        if len(wanted) == 0 or len(self.student_ids) == 0:
+            return
+        positions = np.searchsorted(self.student_ids, wanted)
+        positions = np.minimum(positions, len(self.student_ids) - 1)
+        for student_id, position in zip(wanted, positions):
+            if self.student_ids[position] == student_id:
+                yield int(student_id), int(self._bounds[position]), int(self._bounds[position + 1])
+
+
+class EmbeddingStore:
+    def __init__(self, root: str = config.EMBEDDING_STORE_DIR):
+        self.root = root
+        self._snapshot: Optional[EmbeddingSnapshot] = None
+        self._current_stat = None
+        self._lock = threading.Lock()
+        self._export_lock = threading.Lock()
+        self._exporting = False
+        self._export_again = False
+
+    @property
+    def _current_file(self) -> str:
+        return os.path.join(self.root, "CURRENT")
+
+    def refresh(self) -> Optional[EmbeddingSnapshot]:
+        """
+        The live snapshot, remapped if another process (or export()) swapped in a
+        new version. Costs one stat() when nothing changed.
+        """
+        try:
+            stat = os.stat(self._current_file)
+            current_stat = (stat.st_mtime_ns, stat.st_ino)
+        except FileNotFoundError:
+            return None
+        if current_stat == self._current_stat:
+            return self._snapshot
+
+        with self._lock:
+            if current_stat != self._current_stat:
+                with open(self._current_file) as f:
+                    version = f.read().strip()
+                if self._snapshot is None or self._snapshot.version != version:
+                    self._snapshot = EmbeddingSnapshot(version, os.path.join(self.root, version))
+                self._current_stat = current_stat
+        return self._snapshot
+
+    def version(self) -> Optional[str]:
+        snapshot = self.refresh()
+        return snapshot.version if snapshot is not None else None
+
+    def export(self, db: Session) -> str:
+        """
+        Writes a new version with every decodable template and makes it current.
+        """
+        import numpy as np
+
+        templates = defaultdict(list)
+        queries = [
+            select(models.Student.id, models.Student.face_encoding).where(models.Student.face_encoding != None),
+            select(models.FaceTemplate.student_id, models.FaceTemplate.embedding).order_by(models.FaceTemplate.id),
+        ]
+        for query in queries:
+            for student_id, blob in db.execute(query.execution_options(yield_per=EXPORT_BATCH_SIZE)):
+                vector = embedding_codec.decode(blob)
+                if vector is not None:
+                    templates[student_id].append(vector)
+
+        student_ids = sorted(templates)
+        n_rows = sum(len(templates[student_id]) for student_id in student_ids)
+        dim = len(templates[student_ids[0]][0]) if student_ids else embedding_codec.LEGACY_DIM
+
+        os.makedirs(self.root, exist_ok=True)
+        version = f"v{time.time_ns()}"
+        tmp_dir = os.path.join(self.root, f".{version}.{uuid.uuid4().hex}.tmp")
+        os.makedirs(tmp_dir)
+
+        matrix = np.lib.format.open_memmap(
+            os.path.join(tmp_dir, "embeddings.npy"), mode="w+", dtype=config.EMBEDDING_DTYPE, shape=(n_rows, dim)
+        )
+        offsets = np.empty(len(student_ids), dtype=np.int64)
+        row = 0
+        for index, student_id in enumerate(student_ids):
+            offsets[index] = row
+            for vector in templates[student_id]:
+                matrix[row] = vector
+                row += 1
+        matrix.flush()
+        del matrix
+        np.save(os.path.join(tmp_dir, "student_ids.npy"), np.asarray(student_ids, dtype=np.int64))
+        np.save(os.path.join(tmp_dir, "offsets.npy"), offsets)
+
+        # Complete directory first, then the pointer: readers only ever see whole versions
+        os.replace(tmp_dir, os.path.join(self.root, version))
+        tmp_current = f"{self._current_file}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_current, "w") as f:
+            f.write(version)
+        os.replace(tmp_current, self._current_file)
+
+        self._prune(keep=version)
+        return version
+
+    def _prune(self, keep: str):
+        # Older versions may still be mapped by other workers; unlinking mapped files is safe on POSIX
+        versions = sorted(name for name in os.listdir(self.root) if name.startswith("v"))
+        for name in versions[:-KEEP_VERSIONS]:
+            if name != keep:
+                shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+
+    def request_export(self):
+        """
+        Background-task entry point after an enrollment. Requests arriving while an
+        export runs are coalesced into one more export afterwards.
+        """
+        from app.database import SessionLocal
+
+        with self._export_lock:
+            if self._exporting:
+                self._export_again = True
+                return
+            self._exporting = True
+        try:
+            while True:
+                with SessionLocal() as db:
+                    self.export(db)
+                with self._export_lock:
+                    if not self._export_again:
+                        self._exporting = False
+                        return
+                    self._export_again = False
+        except Exception:
+            with self._export_lock:
+                self._exporting = False
+            raise
+
+
+embedding_store = EmbeddingStore()
+
+
+if __name__ == "__main__":
+    from app.database import SessionLocal, init_db
+
+    init_db()
+    with SessionLocal() as db:
+        version = embedding_store.export(db)
+    snapshot = embedding_store.refresh()
+    print(f"[OK] Embedding store {version}: {len(snapshot)} students, {len(snapshot.embeddings)} templates")
@@ -0,0 +1,112 @@
+"""
+Content-addressed store for attendance evidence photos.
+
+A photo is identified by the SHA-256 of the uploaded bytes, so a retried upload of the
+same photo is stored once. Files are sharded by the first hash characters to keep
+directories small:
+
+    EVIDENCE_DIR/ab/cd/abcd...ef.jpg        recompressed, longest side <= EVIDENCE_MAX_DIMENSION
+    EVIDENCE_DIR/ab/cd/abcd...ef.thumb.jpg  thumbnail for the review UI
+
+Attendance.image_path holds the hex digest. Rows written before this store keep their
+old "assets/attendance_images/<uuid>.<ext>" path; resolve() handles both.
+Pillow is imported lazily (see ai_service).
+"""
+import hashlib
+import io
+import os
+import uuid
+from typing import Optional
+
+from app import config
+from app.utils import metrics
+
+DIGEST_LENGTH = 64
+
+
+def content_hash(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+def is_digest(image_path: Optional[str]) -> bool:
+    if not image_path or len(image_path) != DIGEST_LENGTH:
+        return False
+    try:
+        int(image_path, 16)
+    except ValueError:
+        return False
+    return True
+
+
+def _shard_dir(digest: str) -> str:
+    return os.path.join(config.EVIDENCE_DIR, digest[:2], digest[2:4])
+
+
+def image_file(digest: str) -> str:
+    return os.path.join(_shard_dir(digest), f"{digest}.jpg")
+
+
+def thumbnail_file(digest: str) -> str:
+    return os.path.join(_shard_dir(digest), f"{digest}.thumb.jpg")
+
+
+def resolve(image_path: Optional[str], thumbnail: bool = False) -> Optional[str]:
+    """
+    File on disk for an Attendance.image_path, or None if it is gone (archived/never written).
+    Legacy paths have no thumbnail; the original file is returned instead.
+    """
+    if not image_path:
+        return None
+    if is_digest(image_path):
+        path = thumbnail_file(image_path) if thumbnail else image_file(image_path)
+    else:
+        path = image_path
+    return path if os.path.exists(path) else None
+
+
+def _write_atomic(path: str, data: bytes):
+    # Write to a temp name and rename, so readers never see a half-written image
+    # and concurrent saves of the same digest are harmless
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _encode_jpeg(image, max_dimension: int, quality: int) -> bytes:
+    image = image.copy()
+    image.thumbnail((max_dimension, max_dimension))
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality, optimize=True)
+    return buffer.getvalue()
+
+
+def save(digest: str, content: bytes):
+    """
+    Stores the photo under its digest (computed by the caller with content_hash, so the
+    digest can go into the attendance row before this runs in a background task).
+    No-op when the digest is already stored.
+    """
+    with metrics.timer("evidence_write"):
+        _save(digest, content)
+
+
+def _save(digest: str, content: bytes):
+    path = image_file(digest)
+    if os.path.exists(path):
+        return
+
+    from PIL import Image, ImageOps
+
+    os.makedirs(_shard_dir(digest), exist_ok=True)
+    try:
+        image = Image.open(io.BytesIO(content))
+        image.draft("RGB", (config.EVIDENCE_MAX_DIMENSION, config.EVIDENCE_MAX_DIMENSION))
+        image = ImageOps.exif_transpose(image).convert("RGB")
+    except Exception:
+        # Not a decodable image: keep the bytes as they are, without a thumbnail
+        _write_atomic(path, content)
+        return
+
+    _write_atomic(thumbnail_file(digest), _encode_jpeg(image, config.EVIDENCE_THUMBNAIL_SIZE, 70))
+    _write_atomic(path, _encode_jpeg(image, config.EVIDENCE_MAX_DIMENSION, config.EVIDENCE_JPEG_QUALITY))
@@ -0,0 +1,149 @@
+import asyncio
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+from typing import Optional
+
+from app import config
+from app.utils import ai_service, metrics
+
+WARM_UP_POLL_S = 0.1
+
+
+def _init_worker():
+    """
+    Runs once in every worker process: loads and warms up all models,
+    so each worker is ready before its first job.
+    """
+    ai_service.registry.warm_up()
+
+
+def _worker_status() -> dict:
+    return ai_service.registry.status()
+
+
+class FaceEngine:
+    """
+    Runs the CPU-bound face functions from ai_service in a process pool so the
+    event loop stays free. N workers serve N verifications at the same time.
+    """
+
+    def __init__(self, workers: int = config.FACE_WORKERS):
+        self.workers = workers
+        self._executor = None
+        self._worker_status: list[dict] = []
+        self.startup_ms = None
+        self._lock = None
+
+    def start(self):
+        if self._executor is not None:
+            return
+
+        start = time.perf_counter()
+        if self.workers > 0:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=get_context("spawn"),
+                initializer=_init_worker,
+            )
+            # Spawn every worker now (and warm up its models) instead of on the first request.
+            # A worker still in _init_worker takes no job, so the warm ones may answer every
+            # probe: keep probing until each worker has reported its own pid.
+            statuses = {}
+            while True:
+                futures = [self._executor.submit(_worker_status) for _ in range(self.workers)]
+                for f in futures:
+                    status = f.result()
+                    statuses[status["pid"]] = status
+                if len(statuses) >= self.workers:
+                    break
+                time.sleep(WARM_UP_POLL_S)
+            self._worker_status = list(statuses.values())
+        else:
+            ai_service.registry.warm_up()
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="face-engine")
+            self._worker_status = [ai_service.registry.status()]
+        self.startup_ms = (time.perf_counter() - start) * 1000
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+            self._worker_status = []
+
+    def status(self) -> dict:
+        """
+        Readiness info: the engine is ready once its pool is running and every worker is warm.
+        """
+        ready = (
+            self._executor is not None
+            and len(self._worker_status) == (self.workers or 1)
+            and all(w["warm"] for w in self._worker_status)
+        )
+        return {
+            "ready": ready,
+            "mode": "process" if self.workers > 0 else "thread",
+            "workers": self.workers,
+            "startup_ms": self.startup_ms,
+            "models": self._worker_status,
+        }
+
+    def _get_lock(self) -> asyncio.Lock:
+        # Created on first use, like AdmissionLimiter's semaphore
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    async def _ensure_started(self):
+        # start() spawns and warms up every worker: run it off the event loop, once
+        if self._executor is not None:
+            return
+        async with self._get_lock():
+            if self._executor is None:
+                await asyncio.to_thread(self.start)
+
+    async def _restart(self, broken):
+        """
+        Replaces a crashed pool. Every job in flight sees BrokenProcessPool at once;
+        only the first one rebuilds, the others find a new pool and just retry.
+        """
+        async with self._get_lock():
+            if self._executor is not broken:
+                return
+            self._executor = None
+            self._worker_status = []
+            broken.shutdown(wait=False, cancel_futures=True)
+            await asyncio.to_thread(self.start)
+
+    async def _run(self, fn, *args):
+        await self._ensure_started()
+
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        executor = self._executor
+        try:
+            result, quality_error, timings = await loop.run_in_executor(executor, ai_service.run_timed, fn, *args)
+        except BrokenProcessPool:
+            # A worker crashed (e.g. inside dlib). Rebuild the pool and retry once.
+            await self._restart(executor)
+            result, quality_error, timings = await loop.run_in_executor(self._executor, ai_service.run_timed, fn, *args)
+
+        # Worker-side stages plus the whole round trip (queueing in the pool + pickling included)
+        metrics.observe_stages(timings)
+        metrics.stage_seconds.observe("face_engine", time.perf_counter() - start)
+        if quality_error is not None:
+            raise quality_error
+        return result
+
+    async def validate_face(self, image_bytes: bytes, known_templates: list[bytes]) -> tuple[bool, float]:
+        return await self._run(ai_service.validate_face, image_bytes, known_templates)
+
+    async def get_face_encoding(self, image_bytes: bytes) -> Optional[bytes]:
+        return await self._run(ai_service.get_face_encoding, image_bytes)
+
+    async def get_face_encodings(self, image_bytes: bytes) -> list[tuple[tuple[int, int, int, int], bytes]]:
+        return await self._run(ai_service.get_face_encodings, image_bytes)
+
+
+face_engine = FaceEngine()
@@ -0,0 +1,207 @@
+from __future__ import annotations
+
+import threading
+from collections import defaultdict
+from typing import TYPE_CHECKING, Optional
+
+from sqlalchemy.orm import Session
+
+from app import config, models
+from app.utils import embedding_codec
+from app.utils.embedding_store import embedding_store
+
+if TYPE_CHECKING:
+    import numpy as np
+
+MATCH_TOLERANCE = 0.6  # Same threshold validate_face uses for 1:1 matching
+
+
+class ClassGallery:
+    """
+    All enrollment templates of one class, matched with one vectorized distance
+    computation. The gallery holds no copy of the embeddings: `rows` are row numbers
+    into the shared memory-mapped store (embedding_store.py), gathered on each lookup,
+    so the galleries a worker caches cost a few bytes per template instead of a private
+    copy of the campus embeddings. Only students missing from the store (enrolled after
+    the last export) have their templates in the small private `extra` matrix.
+    A student's templates are contiguous (store rows first, then `extra`) and start at
+    offsets[i]; a student's distance is the one of their closest template, or in "mean"
+    template matching the distance to the centroid of their templates.
+    """
+
+    def __init__(
+        self,
+        student_ids: list[int],
+        offsets: list[int],
+        store: Optional[np.ndarray] = None,
+        rows: Optional[np.ndarray] = None,
+        extra: Optional[np.ndarray] = None,
+        mode: str = config.FACE_TEMPLATE_MATCHING,
+    ):
+        self.student_ids = student_ids
+        self.offsets = offsets
+        self.store = store
+        self.rows = rows
+        self.extra = extra
+        self.mode = mode
+
+    def __len__(self):
+        return len(self.student_ids)
+
+    def _templates(self) -> np.ndarray:
+        import numpy as np
+
+        parts = []
+        if self.rows is not None and len(self.rows):
+            parts.append(self.store[self.rows])  # Gathers from the page cache, freed after the lookup
+        if self.extra is not None and len(self.extra):
+            parts.append(self.extra)
+        return np.concatenate(parts).astype(np.float32, copy=False)
+
+    def _distances(self, encodings: np.ndarray) -> np.ndarray:
+        """
+        (k, 128) probes -> (k, n_students) distances.
+        """
+        import numpy as np
+
+        probes = np.asarray(encodings, dtype=np.float32)
+        templates = self._templates()
+        if self.mode == "mean":
+            counts = np.diff(np.append(self.offsets, len(templates)))
+            templates = np.add.reduceat(templates, self.offsets, axis=0) / counts[:, None]
+        # ||a - b||^2 = ||a||^2 + ||b||^2 - 2ab, computed as a single matrix product
+        sq = (
+            np.sum(probes ** 2, axis=1)[:, None]
+            + np.sum(templates ** 2, axis=1)[None, :]
+            - 2.0 * probes @ templates.T
+        )
+        distances = np.sqrt(np.maximum(sq, 0.0))
+        if len(templates) != len(self.student_ids):
+            distances = np.minimum.reduceat(distances, self.offsets, axis=1)
+        return distances
+
+    def best_match(self, encoding: np.ndarray) -> Optional[tuple[int, float]]:
+        """
+        Returns (student_id, distance) of the closest enrolled face,
+        or None if nobody is within MATCH_TOLERANCE.
+        """
+        if not self.student_ids:
+            return None
+
+        import numpy as np
+        distances = self._distances(encoding[None, :])[0]
+        idx = int(np.argmin(distances))
+        distance = float(distances[idx])
+        if distance >= MATCH_TOLERANCE:
+            return None
+        return self.student_ids[idx], distance
+
+    def match_many(self, encodings: list[np.ndarray]) -> list[Optional[tuple[int, float]]]:
+        """
+        Matches k faces at once against the whole class using one (k, n) distance matrix.
+        Each student is assigned to at most one face (the closest one); other faces
+        that land on the same student get None.
+        """
+        if len(encodings) == 0:
+            return []
+        if not self.student_ids:
+            return [None] * len(encodings)
+
+        import numpy as np
+        encodings = np.vstack(encodings)
+        distances = self._distances(encodings)
+
+        best_idx = np.argmin(distances, axis=1)
+        best_dist = distances[np.arange(len(encodings)), best_idx]
+
+        results: list[Optional[tuple[int, float]]] = [None] * len(encodings)
+        taken = set()
+        for face_idx in np.argsort(best_dist):
+            distance = float(best_dist[face_idx])
+            student_idx = int(best_idx[face_idx])
+            if distance >= MATCH_TOLERANCE or student_idx in taken:
+                continue
+            taken.add(student_idx)
+            results[face_idx] = (self.student_ids[student_idx], distance)
+        return results
+
+
+class GalleryCache:
+    """
+    In-memory ClassGallery per class_id, built lazily for the class members from the
+    shared embedding store (embedding_store.py), falling back to Student.face_encoding +
+    FaceTemplate rows for students not exported yet. Galleries are rebuilt when a new
+    store version is swapped in; call invalidate() whenever enrollment or class
+    membership changes.
+    """
+
+    def __init__(self):
+        self._galleries: dict[int, tuple[Optional[str], ClassGallery]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, db: Session, class_id: int) -> ClassGallery:
+        version = embedding_store.version()
+        cached = self._galleries.get(class_id)
+        if cached is None or cached[0] != version:
+            gallery = self._build(db, class_id)
+            with self._lock:
+                self._galleries[class_id] = (version, gallery)
+            return gallery
+        return cached[1]
+
+    def invalidate(self, class_id: Optional[int] = None):
+        with self._lock:
+            if class_id is None:
+                self._galleries.clear()
+            else:
+                self._galleries.pop(class_id, None)
+
+    def _build(self, db: Session, class_id: int) -> ClassGallery:
+        member_ids = {
+            row.student_id
+            for row in db.query(models.ClassMember.student_id).filter(models.ClassMember.class_id == class_id)
+        }
+
+        import numpy as np
+
+        snapshot = embedding_store.refresh()
+        ranges = list(snapshot.rows_for(member_ids)) if snapshot is not None else []
+
+        # Enrolled after the last export (or store not exported yet): read their blobs
+        templates = defaultdict(list)
+        missing = list(member_ids - {student_id for student_id, _, _ in ranges})
+        if missing:
+            primary = db.query(models.Student.id, models.Student.face_encoding).filter(
+                models.Student.id.in_(missing)
+            ).all()
+            extra = db.query(models.FaceTemplate.student_id, models.FaceTemplate.embedding).filter(
+                models.FaceTemplate.student_id.in_(missing)
+            ).order_by(models.FaceTemplate.id).all()
+            for student_id, blob in primary + extra:
+                vector = embedding_codec.decode(blob)
+                if vector is not None:
+                    templates[student_id].append(vector)
+
+        student_ids = []
+        offsets = []
+        n_templates = 0
+        for student_id, first_row, end_row in ranges:
+            student_ids.append(student_id)
+            offsets.append(n_templates)
+            n_templates += end_row - first_row
+        rows = np.concatenate([np.arange(a, b) for _, a, b in ranges]) if ranges else None
+
+        extra_vectors = []
+        for student_id in sorted(templates):
+            student_ids.append(student_id)
+            offsets.append(n_templates)
+            n_templates += len(templates[student_id])
+            extra_vectors.extend(templates[student_id])
+        extra_matrix = np.vstack(extra_vectors).astype(config.EMBEDDING_DTYPE) if extra_vectors else None
+
+        return ClassGallery(
+            student_ids, offsets, snapshot.embeddings if snapshot is not None else None, rows, extra_matrix
+        )
+
+
+gallery_cache = GalleryCache()
@@ -0,0 +1,173 @@
+"""
+Group-commit writer for attendance inserts.
+
+Under a check-in burst every request used to commit its own SQLite transaction, so
+they all queued on the database write lock. AttendanceWriter collects the inserts
+that arrive within GROUP_COMMIT_WINDOW_MS and writes them in one transaction from a
+single writer thread, then hands every request its own result.
+"""
+import asyncio
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import IntegrityError
+
+from app import config, models, schemas
+from app.database import SessionLocal
+from app.utils import metrics, rollup
+
+
+@dataclass(frozen=True)
+class AttendanceJob:
+    student_id: int
+    session_id: int
+    class_id: int
+    method: str
+    confidence_score: float
+    image_path: Optional[str]
+    timestamp: datetime
+
+    def to_model(self) -> models.Attendance:
+        return models.Attendance(
+            student_id=self.student_id,
+            date=self.timestamp.strftime("%Y-%m-%d"),
+            timestamp=self.timestamp,
+            status="Hadir",
+            session_id=self.session_id, # Link ke sesi aktif
+            method=self.method,
+            confidence_score=self.confidence_score,
+            image_path=self.image_path
+        )
+
+
+class AttendanceWriter:
+    def __init__(self, window_ms: float = config.GROUP_COMMIT_WINDOW_MS, max_batch: int = config.GROUP_COMMIT_MAX_BATCH):
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        # One thread = one SQLite writer, so batches never compete for the write lock
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="attendance-writer")
+
+    def start(self):
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._queue = asyncio.Queue()
+            self._task = loop.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def submit(self, job: AttendanceJob) -> Optional[schemas.Attendance]:
+        """
+        Queues one insert and waits for its batch to commit.
+        Returns the saved row, or None if the student already attended the session.
+        """
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((job, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            jobs = [job for job, _ in batch]
+            try:
+                # One transaction (duplicate check + inserts + rollups + commit) per batch
+                with metrics.timer("db_commit"):
+                    results = await loop.run_in_executor(self._executor, write_batch, jobs)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+
+def write_batch(jobs: list[AttendanceJob]) -> list[Optional[schemas.Attendance]]:
+    """
+    Inserts all jobs (plus their rollup updates) in one transaction.
+    Duplicates - already in the DB or twice in the same batch - get None.
+    """
+    with SessionLocal() as db:
+        existing = set(
+            db.query(models.Attendance.student_id, models.Attendance.session_id).filter(
+                or_(*[
+                    and_(models.Attendance.student_id == job.student_id, models.Attendance.session_id == job.session_id)
+                    for job in jobs
+                ])
+            ).all()
+        )
+
+        accepted = {}
+        for index, job in enumerate(jobs):
+            key = (job.student_id, job.session_id)
+            if key not in existing:
+                accepted[index] = key
+                existing.add(key)
+
+        try:
+            return _insert(db, jobs, accepted)
+        except IntegrityError:
+            # Another process inserted one of these rows meanwhile: fall back to one transaction per row
+            db.rollback()
+            results = []
+            for index, job in enumerate(jobs):
+                if index not in accepted:
+                    results.append(None)
+                    continue
+                try:
+                    results.append(_insert(db, [job], {0: accepted[index]})[0])
+                except IntegrityError:
+                    db.rollback()
+                    results.append(None)
+            return results
+
+
+def _insert(db, jobs: list[AttendanceJob], accepted: dict) -> list[Optional[schemas.Attendance]]:
+    rows = {index: jobs[index].to_model() for index in accepted}
+    db.add_all(rows.values())
+    db.flush()
+    results = [
+        schemas.Attendance.model_validate(rows[index]) if index in rows else None
+        for index in range(len(jobs))
+    ]
+
+    # One rollup UPDATE per session instead of one per row
+    by_session = defaultdict(list)
+    for index in rows:
+        by_session[(jobs[index].class_id, jobs[index].session_id)].append(jobs[index])
+    for (class_id, _), session_jobs in by_session.items():
+        rollup.record_attendance(
+            db, class_id, [job.student_id for job in session_jobs], max(job.timestamp for job in session_jobs)
+        )
+
+    db.commit()
+    return results
+
+
+attendance_writer = AttendanceWriter()
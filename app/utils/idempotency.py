@@ -0,0 +1,95 @@
+"""
+Idempotent attendance submission.
+
+Clients on flaky Wi-Fi resubmit the same photo after a timeout. A submission is
+identified by (nim, class_id, method, token) where token is the Idempotency-Key
+header or, without one, the SHA-256 of the photo. The first final result for a key
+is kept until its session ends and every retry gets that identical response without
+the photo being decoded again. A retry arriving while the first request is still
+being processed waits for it instead of starting a second verification.
+
+Claims run on the event loop, so they need no locking.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Optional
+
+from app import config
+
+MAX_KEY_LENGTH = 200
+
+
+def submission_key(nim: str, class_id: int, method: str, idempotency_key: Optional[str], photo_hash: str) -> tuple:
+    token = idempotency_key[:MAX_KEY_LENGTH] if idempotency_key else photo_hash
+    return (nim, class_id, method, token)
+
+
+class Claim:
+    def __init__(self, cache: "IdempotencyCache", key: tuple, response=None):
+        self.cache = cache
+        self.key = key
+        self.response = response  # Cached response of an earlier identical submission
+
+    def finish(self, response, session_id: int, until: datetime):
+        """
+        Stores a final result for the session (valid until `until`, normally the session
+        end) and returns it, so routes can write `return claim.finish({...}, ...)`.
+        Results that may change on retry (no session yet, overloaded, ...) are
+        returned without finish().
+        """
+        self.cache._store(self.key, response, session_id, until)
+        return response
+
+
+class IdempotencyCache:
+    def __init__(self, max_entries: int = config.IDEMPOTENCY_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._results: dict = {}   # key -> (until, session_id, response), insertion ordered
+        self._inflight: dict = {}  # key -> asyncio.Event set when the owner is done
+        self.hits = 0
+
+    def get(self, key: tuple):
+        item = self._results.get(key)
+        if item is None:
+            return None
+        until, _, response = item
+        if until < datetime.now():
+            self._results.pop(key, None)
+            return None
+        return response
+
+    def _store(self, key: tuple, response, session_id: int, until: datetime):
+        self._results[key] = (until, session_id, response)
+        while len(self._results) > self.max_entries:
+            self._results.pop(next(iter(self._results)))
+
+    def invalidate_session(self, session_id: int):
+        # A deleted session's results must not be replayed into a new session.
+        # Called from sync routes (threadpool): snapshot the items in one step
+        for key, (_, sid, _) in list(self._results.items()):
+            if sid == session_id:
+                self._results.pop(key, None)
+
+    @asynccontextmanager
+    async def claim(self, key: tuple):
+        # Same submission in flight: wait for it, then use its result (if it stored one)
+        while key in self._inflight:
+            await self._inflight[key].wait()
+
+        claim = Claim(self, key, self.get(key))
+        if claim.response is not None:
+            self.hits += 1
+            yield claim
+            return
+
+        event = asyncio.Event()
+        self._inflight[key] = event
+        try:
+            yield claim
+        finally:
+            del self._inflight[key]
+            event.set()
+
+
+idempotency_cache = IdempotencyCache()
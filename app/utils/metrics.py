@@ -0,0 +1,109 @@
+"""
+In-process metrics in the Prometheus text format (served on GET /metrics).
+
+    presence_stage_seconds{stage=...}            histogram per pipeline stage
+    presence_attendance_outcomes_total{outcome=...}  counter per attendance outcome
+
+p50/p95/p99 per stage come from the buckets, e.g.
+    histogram_quantile(0.95, rate(presence_stage_seconds_bucket[5m]))
+Stages measured inside the face workers (decode, quality, detection, encoding,
+distance) are sent back with each result by face_engine and recorded here.
+Every API process keeps its own numbers; scrape each worker separately.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Seconds; covers cache hits (sub-ms) up to slow CPU-only face encoding
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, label: str, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label = label
+        self.buckets = tuple(buckets)
+        self._series: dict = {}  # label value -> [count per bucket (+Inf last), sum]
+        self._lock = threading.Lock()
+
+    def observe(self, label_value: str, value: float):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: (list(counts), total) for key, (counts, total) in self._series.items()}
+        for label_value in sorted(series):
+            counts, total = series[label_value]
+            label = f'{self.label}="{_escape(label_value)}"'
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{self.name}_bucket{{{label},le="{le}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{label}}} {total}")
+            lines.append(f"{self.name}_count{{{label}}} {cumulative}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, label: str):
+        self.name = name
+        self.documentation = documentation
+        self.label = label
+        self._values: dict = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_value: str, amount: int = 1):
+        with self._lock:
+            self._values[label_value] = self._values.get(label_value, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = dict(self._values)
+        for label_value in sorted(values):
+            lines.append(f'{self.name}{{{self.label}="{_escape(label_value)}"}} {values[label_value]}')
+        return lines
+
+
+stage_seconds = Histogram("presence_stage_seconds", "Time spent per attendance pipeline stage.", "stage")
+outcomes = Counter("presence_attendance_outcomes_total", "Attendance submissions by outcome.", "outcome")
+
+
+@contextmanager
+def timer(stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stage_seconds.observe(stage, time.perf_counter() - start)
+
+
+def observe_stages(timings: dict):
+    for stage, seconds in timings.items():
+        stage_seconds.observe(stage, seconds)
+
+
+def render(gauges: dict = None, counters: dict = None) -> str:
+    """
+    gauges: extra name -> (documentation, value) exported as-is (e.g. queue depth).
+    counters: the same for totals kept elsewhere that only ever increase (e.g. rejections).
+    """
+    lines = stage_seconds.render() + outcomes.render()
+    for kind, values in (("gauge", gauges), ("counter", counters)):
+        for name, (documentation, value) in (values or {}).items():
+            lines += [f"# HELP {name} {documentation}", f"# TYPE {name} {kind}", f"{name} {value}"]
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,229 @@
+"""
+On-demand request profiling for production.
+
+Only installed when config.PROFILING_TOKEN is set (see app/main.py); without a token
+there is no middleware at all. With it, a request that is not being profiled costs
+one attribute check and a scan of its header list.
+
+Two ways to profile:
+  - POST /debug/profile?path=/attendance/&count=20 (header X-Profile-Token) arms a
+    capture: the next `count` requests whose path starts with `path` are profiled and
+    aggregated into one report.
+  - A single request sent with the header "X-Profile: <token>" is profiled on its own;
+    the response carries the report id in X-Profile-Report.
+
+Each finished capture writes into PROFILE_DIR:
+    <id>.txt        pstats call statistics (sorted by cumulative time) of all its requests
+    <id>.prof       the raw pstats dump (snakeviz, pstats.Stats(...))
+    <id>.collapsed  sampled stacks in the collapsed format of flamegraph.pl / speedscope
+
+cProfile hooks the event-loop thread, so while a request is profiled other coroutines
+running on the loop show up in its stats as well; profile under moderate load or read
+the report with that in mind. Sync routes (threadpool) and the face workers (separate
+processes) are not covered here; their timings are in /metrics.
+Only one request is profiled at a time, matching requests arriving meanwhile run normally.
+"""
+import asyncio
+import cProfile
+import hmac
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from functools import lru_cache
+from typing import Optional
+
+from app import config
+
+PROFILE_HEADER = b"x-profile"
+REPORT_HEADER = b"x-profile-report"
+REPORT_LINES = 60
+KEEP_REPORTS = 20
+
+
+@lru_cache(maxsize=4096)
+def _frame_label(code) -> str:
+    # Last two path components are enough to tell app/, starlette/, sqlalchemy/ apart
+    path = "/".join(code.co_filename.replace("\\", "/").split("/")[-2:])
+    return f"{code.co_name} ({path}:{code.co_firstlineno})"
+
+
+def _collapse(frame) -> str:
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class StackSampler(threading.Thread):
+    """
+    Samples the stack of one thread (the event loop) every `interval` seconds.
+    """
+
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[_collapse(frame)] += 1
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+
+class Capture:
+    def __init__(self, path_prefix: str, count: int, method: Optional[str] = None):
+        self.id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        self.path_prefix = path_prefix
+        self.method = method.upper() if method else None
+        self.remaining = count
+        self.requests: list[tuple[str, str, float]] = []  # (method, path, ms)
+        self.stats: Optional[pstats.Stats] = None
+        self.stacks = Counter()
+
+    def matches(self, scope) -> bool:
+        return scope["path"].startswith(self.path_prefix) and (self.method is None or scope["method"] == self.method)
+
+    def add(self, profile: cProfile.Profile, stacks: Counter, method: str, path: str, ms: float):
+        if self.stats is None:
+            self.stats = pstats.Stats(profile, stream=io.StringIO())
+        else:
+            self.stats.add(profile)
+        self.stacks.update(stacks)
+        self.requests.append((method, path, ms))
+
+    def write(self, directory: str) -> list[str]:
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, self.id)
+
+        self.stats.dump_stats(f"{base}.prof")
+
+        report = io.StringIO()
+        report.write(f"Profile {self.id}: {len(self.requests)} request(s)\n")
+        for method, path, ms in self.requests:
+            report.write(f"  {method} {path} {ms:.1f} ms\n")
+        report.write("\n")
+        self.stats.stream = report
+        self.stats.sort_stats("cumulative").print_stats(REPORT_LINES)
+        with open(f"{base}.txt", "w") as f:
+            f.write(report.getvalue())
+
+        with open(f"{base}.collapsed", "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+        return [f"{self.id}.txt", f"{self.id}.prof", f"{self.id}.collapsed"]
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "path": self.path_prefix,
+            "method": self.method,
+            "remaining": self.remaining,
+            "captured": len(self.requests),
+        }
+
+
+class Profiler:
+    """
+    Capture state. Only touched from the event loop (middleware and async
+    debug routes), so it needs no locking.
+    """
+
+    def __init__(self):
+        self.capture: Optional[Capture] = None  # Armed by the admin endpoint
+        self.active = False                     # A request is being profiled right now
+        self.reports = deque(maxlen=KEEP_REPORTS)
+
+    def arm(self, path_prefix: str, count: int, method: Optional[str] = None) -> Capture:
+        self.capture = Capture(path_prefix, count, method)
+        return self.capture
+
+    async def disarm(self) -> Optional[dict]:
+        # Requests captured so far still get their report
+        capture, self.capture = self.capture, None
+        if capture is not None and capture.requests:
+            return await self.finish(capture)
+        return None
+
+    async def finish(self, capture: Capture) -> dict:
+        if self.capture is capture:
+            self.capture = None
+        files = await asyncio.to_thread(capture.write, config.PROFILE_DIR)
+        report = {**capture.summary(), "files": files}
+        self.reports.appendleft(report)
+        return report
+
+    def status(self) -> dict:
+        return {
+            "armed": self.capture.summary() if self.capture is not None else None,
+            "active": self.active,
+            "reports": list(self.reports),
+        }
+
+
+profiler = Profiler()
+
+
+class ProfilingMiddleware:
+    def __init__(self, app, token: str = config.PROFILING_TOKEN):
+        self.app = app
+        self.token = token.encode()
+        self.interval = config.PROFILE_SAMPLE_INTERVAL_MS / 1000
+
+    def _has_profile_header(self, scope) -> bool:
+        for name, value in scope["headers"]:
+            if name == PROFILE_HEADER:
+                return hmac.compare_digest(value, self.token)
+        return False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or profiler.active:
+            await self.app(scope, receive, send)
+            return
+
+        capture = profiler.capture
+        one_off = False
+        if capture is None or not capture.matches(scope):
+            if not self._has_profile_header(scope):
+                await self.app(scope, receive, send)
+                return
+            capture = Capture(scope["path"], 1)
+            one_off = True
+
+        capture.remaining -= 1
+        if capture.remaining <= 0 and profiler.capture is capture:
+            profiler.capture = None  # Last request of this capture: stop matching new ones
+
+        async def send_with_report_id(message):
+            if one_off and message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(REPORT_HEADER, capture.id.encode())]
+            await send(message)
+
+        profiler.active = True
+        profile = cProfile.Profile()
+        sampler = StackSampler(threading.get_ident(), self.interval)
+        start = time.perf_counter()
+        sampler.start()
+        profile.enable()
+        try:
+            await self.app(scope, receive, send_with_report_id)
+        finally:
+            profile.disable()
+            sampler.stop()
+            profiler.active = False
+            capture.add(profile, sampler.stacks, scope["method"], scope["path"], (time.perf_counter() - start) * 1000)
+            if capture.remaining <= 0:
+                await profiler.finish(capture)
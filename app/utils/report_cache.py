@@ -0,0 +1,111 @@
+"""
+Cache of serialized report responses with ETags.
+
+Entries depend on ("class", id) / ("student", id) keys. Code that changes attendance
+data calls mark_dirty(db, ...) inside its transaction; the affected entries are dropped
+right after that transaction commits (nothing happens on rollback).
+Writers in other processes (other workers, rollup/retention jobs, scripts) cannot
+reach this cache, so entries also expire after config.REPORT_CACHE_TTL seconds.
+"""
+import hashlib
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app import config
+
+_DIRTY_KEY = "report_cache_dirty"
+
+
+@dataclass(frozen=True)
+class CachedReport:
+    etag: str
+    body: bytes
+    expires_at: float = 0.0
+
+
+class ReportCache:
+    def __init__(self, ttl: float = config.REPORT_CACHE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: dict = {}
+        self._dependents = defaultdict(set)   # dependency -> entry keys
+        self._epoch = 0                       # Bumped on every invalidation
+        self._invalidated_at: dict = {}       # dependency -> epoch of its last invalidation
+        self._cleared_at = 0                  # Epoch of the last clear()
+
+    def get(self, key) -> Optional[CachedReport]:
+        report = self._entries.get(key)
+        if report is None or report.expires_at < time.monotonic():
+            return None
+        return report
+
+    def generation(self) -> int:
+        """
+        Snapshot taken before computing a report; put() refuses to store the result
+        if any of its dependencies - including ones only known after computing it,
+        like the classes in a student report - was invalidated in the meantime.
+        """
+        with self._lock:
+            return self._epoch
+
+    def put(self, key, body: bytes, deps: Iterable, generation: int) -> CachedReport:
+        report = CachedReport(
+            etag=f'"{hashlib.sha1(body).hexdigest()[:20]}"', body=body, expires_at=time.monotonic() + self.ttl
+        )
+        deps = list(deps)
+        with self._lock:
+            if self._cleared_at > generation or any(self._invalidated_at.get(dep, 0) > generation for dep in deps):
+                return report  # Stale already, serve it once but don't cache it
+            self._entries[key] = report
+            for dep in deps:
+                self._dependents[dep].add(key)
+        return report
+
+    def invalidate(self, deps: Iterable):
+        with self._lock:
+            self._epoch += 1
+            for dep in deps:
+                self._invalidated_at[dep] = self._epoch
+                for key in self._dependents.pop(dep, ()):
+                    self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._cleared_at = self._epoch
+            self._invalidated_at.clear()
+            self._entries.clear()
+            self._dependents.clear()
+
+
+report_cache = ReportCache()
+
+
+def mark_dirty(db: Session, class_ids: Iterable[int] = (), student_ids: Iterable[int] = (), everything: bool = False):
+    dirty = db.info.setdefault(_DIRTY_KEY, set())
+    if everything:
+        dirty.add(None)
+    dirty.update(("class", class_id) for class_id in class_ids)
+    dirty.update(("student", student_id) for student_id in student_ids)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(db: Session):
+    dirty = db.info.pop(_DIRTY_KEY, None)
+    if not dirty:
+        return
+    if None in dirty:
+        report_cache.clear()
+    else:
+        report_cache.invalidate(dirty)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(db: Session):
+    db.info.pop(_DIRTY_KEY, None)
@@ -0,0 +1,178 @@
+from sqlalchemy import and_, exists, func, select, union_all
+from sqlalchemy.orm import Session
+
+from app import models, schemas
+
+
+def _summarize(total_sessions: int, total_present: int) -> dict:
+    total_alpha = max(0, total_sessions - total_present) # Safety net
+    percentage = 0.0
+    if total_sessions > 0:
+        percentage = (total_present / total_sessions) * 100
+    return {
+        "total_sessions": total_sessions,
+        "total_present": total_present,
+        "total_alpha": total_alpha,
+        "attendance_percentage": round(percentage, 2),
+    }
+
+
+def attendance_history():
+    """
+    Attendances plus the rows the retention job moved to attendance_archive
+    (student_id, session_id, status, timestamp). Used wherever the full history
+    matters: rollup (re)builds and session deactivation.
+    """
+    columns = lambda table: select(table.student_id, table.session_id, table.status, table.timestamp)
+    return union_all(columns(models.Attendance), columns(models.AttendanceArchive)).subquery()
+
+
+def _attendance_stats(db: Session, memberships, class_id: int = None, student_id: int = None):
+    """
+    One aggregated query returning, per (class, student) row of `memberships`:
+    class_id, class_name, student_id, name, nim, total_sessions, total_present, last_attended.
+    Reports read the attendance_rollups table; this query is the source of truth used
+    to (re)build it.
+
+    Only active (not deleted) sessions of *that* class count, both for the number of
+    sessions and for attendances. class_id / student_id narrow the aggregates.
+    """
+    session_filters = [models.AttendanceSession.is_active == True]
+    if class_id is not None:
+        session_filters.append(models.AttendanceSession.class_id == class_id)
+
+    session_counts = (
+        select(
+            models.AttendanceSession.class_id,
+            func.count(models.AttendanceSession.id).label("total_sessions"),
+        )
+        .where(*session_filters)
+        .group_by(models.AttendanceSession.class_id)
+        .subquery()
+    )
+
+    history = attendance_history()
+    present_filters = session_filters + [history.c.status == "Hadir"]
+    if student_id is not None:
+        present_filters.append(history.c.student_id == student_id)
+
+    present_counts = (
+        select(
+            models.AttendanceSession.class_id,
+            history.c.student_id,
+            func.count().label("total_present"),
+            func.max(history.c.timestamp).label("last_attended"),
+        )
+        .join(models.AttendanceSession, history.c.session_id == models.AttendanceSession.id)
+        .where(*present_filters)
+        .group_by(models.AttendanceSession.class_id, history.c.student_id)
+        .subquery()
+    )
+
+    query = (
+        select(
+            memberships.c.class_id,
+            models.Class.name.label("class_name"),
+            models.Student.id.label("student_id"),
+            models.Student.name,
+            models.Student.nim,
+            func.coalesce(session_counts.c.total_sessions, 0).label("total_sessions"),
+            func.coalesce(present_counts.c.total_present, 0).label("total_present"),
+            present_counts.c.last_attended,
+        )
+        .join(models.Student, models.Student.id == memberships.c.student_id)
+        .join(models.Class, models.Class.id == memberships.c.class_id)
+        .outerjoin(session_counts, session_counts.c.class_id == memberships.c.class_id)
+        .outerjoin(
+            present_counts,
+            and_(
+                present_counts.c.class_id == memberships.c.class_id,
+                present_counts.c.student_id == memberships.c.student_id,
+            ),
+        )
+        .order_by(memberships.c.class_id, models.Student.id)
+    )
+    return db.execute(query).all()
+
+
+def build_class_report(db: Session, class_obj: models.Class) -> schemas.ClassReport:
+    """
+    Reads the class members' rows from attendance_rollups: O(class size),
+    independent of how much attendance history exists.
+    """
+    is_member = exists().where(
+        models.ClassMember.class_id == models.AttendanceRollup.class_id,
+        models.ClassMember.student_id == models.AttendanceRollup.student_id,
+    )
+    rows = db.execute(
+        select(
+            models.Student.id.label("student_id"),
+            models.Student.name,
+            models.Student.nim,
+            models.AttendanceRollup.sessions_held,
+            models.AttendanceRollup.present_count,
+        )
+        .join(models.Student, models.Student.id == models.AttendanceRollup.student_id)
+        .where(models.AttendanceRollup.class_id == class_obj.id, is_member)
+        .order_by(models.Student.id)
+    ).all()
+
+    if rows:
+        total_sessions = rows[0].sessions_held
+    else:
+        # Empty class: still report how many sessions it had
+        total_sessions = db.query(models.AttendanceSession).filter(
+            models.AttendanceSession.class_id == class_obj.id,
+            models.AttendanceSession.is_active == True
+        ).count()
+
+    return schemas.ClassReport(
+        class_id=class_obj.id,
+        class_name=class_obj.name,
+        total_sessions=total_sessions,
+        students=[
+            schemas.StudentReport(
+                student_id=row.student_id,
+                name=row.name,
+                nim=row.nim,
+                **_summarize(row.sessions_held, row.present_count)
+            )
+            for row in rows
+        ]
+    )
+
+
+def build_student_report(db: Session, student: models.Student) -> schemas.StudentDetailReport:
+    # One rollup row per class the student belongs to (memberships + legacy Student.class_id)
+    rows = db.execute(
+        select(
+            models.AttendanceRollup.class_id,
+            models.Class.name.label("class_name"),
+            models.AttendanceRollup.sessions_held,
+            models.AttendanceRollup.present_count,
+        )
+        .join(models.Class, models.Class.id == models.AttendanceRollup.class_id)
+        .where(models.AttendanceRollup.student_id == student.id)
+        .order_by(models.AttendanceRollup.class_id)
+    ).all()
+
+    classes = [
+        schemas.ClassAttendanceSummary(
+            class_id=row.class_id,
+            class_name=row.class_name,
+            **_summarize(row.sessions_held, row.present_count)
+        )
+        for row in rows
+    ]
+    totals = _summarize(
+        sum(row.sessions_held for row in rows),
+        sum(row.present_count for row in rows),
+    )
+
+    return schemas.StudentDetailReport(
+        student_id=student.id,
+        name=student.name,
+        nim=student.nim,
+        classes=classes,
+        **totals
+    )
@@ -0,0 +1,215 @@
+"""
+Retention job for evidence photos and attendance rows of closed sessions.
+
+A session is closed once its date is more than RETENTION_DAYS days ago. For every
+closed session that was not archived yet:
+  1. its evidence photos are packed into EVIDENCE_ARCHIVE_DIR/<class_id>/session_<id>.tar.gz
+     (manifest.json inside maps attendance id -> file),
+  2. with --archive-rows its attendance rows move to attendance_archive,
+  3. a session_archives row is committed, and only then
+  4. the loose files no unarchived session still references are deleted.
+A session archived by an earlier run without --archive-rows is picked up again by the
+next --archive-rows run, which only moves its attendance rows.
+
+Rollup rows are not touched: they already count these attendances, and rebuilds
+read attendance_archive too.
+
+    python -m app.utils.retention --dry-run
+    python -m app.utils.retention --days 120 --archive-rows
+"""
+import argparse
+import io
+import json
+import os
+import tarfile
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import and_, delete, exists, insert, or_, select
+from sqlalchemy.orm import Session
+
+from app import config, models
+from app.utils import evidence_store
+
+ARCHIVED_COLUMNS = ["id", "student_id", "session_id", "timestamp", "date", "status", "method", "confidence_score", "image_path"]
+
+
+def closed_sessions(db: Session, cutoff_date: str, limit: Optional[int] = None, archive_rows: bool = False) -> list[models.AttendanceSession]:
+    archived = exists().where(models.SessionArchive.session_id == models.AttendanceSession.id)
+    pending = ~archived
+    if archive_rows:
+        # Archived without --archive-rows, attendance rows still in place
+        rows_pending = exists().where(
+            models.SessionArchive.session_id == models.AttendanceSession.id,
+            models.SessionArchive.rows_archived == 0
+        )
+        has_rows = exists().where(models.Attendance.session_id == models.AttendanceSession.id)
+        pending = or_(pending, and_(rows_pending, has_rows))
+    query = db.query(models.AttendanceSession).filter(
+        models.AttendanceSession.date < cutoff_date,
+        pending
+    ).order_by(models.AttendanceSession.date, models.AttendanceSession.id)
+    if limit:
+        query = query.limit(limit)
+    return query.all()
+
+
+def _member_name(image_path: str, path: str) -> str:
+    if evidence_store.is_digest(image_path):
+        return f"{image_path}.jpg"
+    return os.path.basename(path)
+
+
+def _evidence_files(attendances: list[models.Attendance]) -> dict:
+    # image_path -> file on disk; a group photo is shared by many rows but stored once
+    files = {}
+    for attendance in attendances:
+        if attendance.image_path and attendance.image_path not in files:
+            path = evidence_store.resolve(attendance.image_path)
+            if path:
+                files[attendance.image_path] = path
+    return files
+
+
+def _write_archive(session: models.AttendanceSession, attendances: list[models.Attendance], files: dict) -> str:
+    archive_dir = os.path.join(config.EVIDENCE_ARCHIVE_DIR, str(session.class_id))
+    os.makedirs(archive_dir, exist_ok=True)
+    archive_path = os.path.join(archive_dir, f"session_{session.id}.tar.gz")
+
+    manifest = json.dumps({
+        "session_id": session.id,
+        "class_id": session.class_id,
+        "date": session.date,
+        "attendances": {
+            str(a.id): _member_name(a.image_path, files[a.image_path])
+            for a in attendances if a.image_path in files
+        },
+    }, indent=2).encode()
+
+    # Written under a temp name: a crash never leaves a truncated archive behind
+    tmp_path = f"{archive_path}.{uuid.uuid4().hex}.tmp"
+    with tarfile.open(tmp_path, "w:gz") as tar:
+        for image_path, path in files.items():
+            tar.add(path, arcname=_member_name(image_path, path))
+        info = tarfile.TarInfo("manifest.json")
+        info.size = len(manifest)
+        info.mtime = int(time.time())
+        tar.addfile(info, io.BytesIO(manifest))
+    os.replace(tmp_path, archive_path)
+    return archive_path
+
+
+def _move_rows(db: Session, session_id: int) -> int:
+    columns = [getattr(models.Attendance, name) for name in ARCHIVED_COLUMNS]
+    db.execute(
+        insert(models.AttendanceArchive).from_select(
+            ARCHIVED_COLUMNS, select(*columns).where(models.Attendance.session_id == session_id)
+        )
+    )
+    result = db.execute(
+        delete(models.Attendance)
+        .where(models.Attendance.session_id == session_id)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount
+
+
+def _still_referenced(db: Session, image_paths) -> set:
+    # Same photo (retry / shared digest) used by an attendance of a session that is not archived
+    archived = exists().where(models.SessionArchive.session_id == models.Attendance.session_id)
+    rows = db.query(models.Attendance.image_path).filter(
+        models.Attendance.image_path.in_(list(image_paths)),
+        ~archived
+    ).distinct()
+    return {row.image_path for row in rows}
+
+
+def _delete_loose_files(files: dict):
+    for image_path, path in files.items():
+        paths = [path]
+        if evidence_store.is_digest(image_path):
+            paths.append(evidence_store.thumbnail_file(image_path))
+        for file_path in paths:
+            try:
+                os.remove(file_path)
+            except FileNotFoundError:
+                pass
+
+
+def archive_session(db: Session, session: models.AttendanceSession, archive_rows: bool = False, dry_run: bool = False) -> dict:
+    attendances = db.query(models.Attendance).filter(models.Attendance.session_id == session.id).all()
+    existing = db.get(models.SessionArchive, session.id)
+    if existing is not None:
+        # Evidence was packed by an earlier run: only the rows are left to move
+        stats = {"files": 0, "bytes": 0, "rows": len(attendances) if archive_rows else 0}
+        if archive_rows and not dry_run:
+            existing.rows_archived = _move_rows(db, session.id)
+            db.commit()
+        return stats
+
+    files = _evidence_files(attendances)
+    stats = {
+        "files": len(files),
+        "bytes": sum(os.path.getsize(path) for path in files.values()),
+        "rows": len(attendances) if archive_rows else 0,
+    }
+    if dry_run:
+        return stats
+
+    archive_path = _write_archive(session, attendances, files) if files else None
+    rows_archived = _move_rows(db, session.id) if archive_rows else 0
+    db.add(models.SessionArchive(
+        session_id=session.id,
+        archive_path=archive_path,
+        file_count=len(files),
+        rows_archived=rows_archived,
+    ))
+    db.commit()
+
+    referenced = _still_referenced(db, files) if files else set()
+    _delete_loose_files({k: v for k, v in files.items() if k not in referenced})
+    return stats
+
+
+def run(db: Session, days: int = config.RETENTION_DAYS, archive_rows: bool = False, dry_run: bool = False, limit: Optional[int] = None) -> dict:
+    if days < 1:
+        raise ValueError("days must be at least 1 (today's sessions are never closed)")
+    cutoff_date = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d")
+    sessions = closed_sessions(db, cutoff_date, limit, archive_rows=archive_rows)
+
+    totals = {"sessions": 0, "files": 0, "bytes": 0, "rows": 0}
+    prefix = "[DRY-RUN] " if dry_run else ""
+    print(f"{prefix}{len(sessions)} closed session(s) before {cutoff_date}")
+    for index, session in enumerate(sessions, start=1):
+        stats = archive_session(db, session, archive_rows=archive_rows, dry_run=dry_run)
+        totals["sessions"] += 1
+        for key in ("files", "bytes", "rows"):
+            totals[key] += stats[key]
+        print(
+            f"{prefix}[{index}/{len(sessions)}] session {session.id} ({session.date}, class {session.class_id}): "
+            f"{stats['files']} file(s), {stats['bytes'] / 1024:.0f} KB, {stats['rows']} row(s)"
+        )
+
+    print(f"{prefix}Done: {totals['sessions']} session(s), {totals['files']} file(s), "
+          f"{totals['bytes'] / 1024 / 1024:.1f} MB, {totals['rows']} row(s) archived")
+    return totals
+
+
+if __name__ == "__main__":
+    from app.database import SessionLocal, init_db
+
+    parser = argparse.ArgumentParser(description="Archive evidence photos (and optionally attendance rows) of closed sessions.")
+    parser.add_argument("--days", type=int, default=config.RETENTION_DAYS, help="sessions older than this many days are closed")
+    parser.add_argument("--archive-rows", action="store_true", help="also move their attendance rows to attendance_archive")
+    parser.add_argument("--dry-run", action="store_true", help="only report what would be archived")
+    parser.add_argument("--limit", type=int, default=None, help="process at most this many sessions")
+    args = parser.parse_args()
+
+    init_db()
+    db = SessionLocal()
+    try:
+        run(db, days=args.days, archive_rows=args.archive_rows, dry_run=args.dry_run, limit=args.limit)
+    finally:
+        db.close()
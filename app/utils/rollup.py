@@ -0,0 +1,157 @@
+"""
+Maintenance of the attendance_rollups table (per student per class: sessions held,
+present count, last attended). Every function here runs inside the caller's
+transaction, so the rollup commits or rolls back together with the change it mirrors.
+
+Backfill / repair:
+    python -m app.utils.rollup
+"""
+from datetime import datetime
+from typing import Iterable, Optional
+
+from sqlalchemy import and_, delete, exists, func, select, union, update
+from sqlalchemy.orm import Session
+
+from app import models
+from app.utils.report_cache import mark_dirty
+from app.utils.report_service import _attendance_stats, attendance_history
+
+Rollup = models.AttendanceRollup
+
+
+def membership_pairs(class_id: Optional[int] = None, student_id: Optional[int] = None, missing_only: bool = False):
+    """
+    (class_id, student_id) pairs a rollup row should exist for: every ClassMember
+    plus the legacy Student.class_id. missing_only keeps pairs without a rollup row.
+    """
+    member_query = select(models.ClassMember.class_id, models.ClassMember.student_id)
+    legacy_query = select(models.Student.class_id, models.Student.id.label("student_id")).where(
+        models.Student.class_id != None
+    )
+    if class_id is not None:
+        member_query = member_query.where(models.ClassMember.class_id == class_id)
+        legacy_query = legacy_query.where(models.Student.class_id == class_id)
+    if student_id is not None:
+        member_query = member_query.where(models.ClassMember.student_id == student_id)
+        legacy_query = legacy_query.where(models.Student.id == student_id)
+
+    pairs = union(member_query, legacy_query).subquery()
+    if not missing_only:
+        return pairs
+
+    has_row = exists().where(and_(Rollup.class_id == pairs.c.class_id, Rollup.student_id == pairs.c.student_id))
+    return select(pairs.c.class_id, pairs.c.student_id).where(~has_row).subquery()
+
+
+def _update(*criteria):
+    # Plain SQL UPDATE; ORM objects in the session don't need to be synchronized
+    return update(Rollup).where(*criteria).execution_options(synchronize_session=False)
+
+
+def ensure_rows(db: Session, class_id: Optional[int] = None, student_id: Optional[int] = None) -> int:
+    """
+    Creates missing rollup rows, computed from attendances/sessions.
+    Called when a student joins a class; with no arguments it repairs the whole table.
+    """
+    pairs = membership_pairs(class_id, student_id, missing_only=True)
+    rows = _attendance_stats(db, pairs, class_id=class_id, student_id=student_id)
+    db.add_all([
+        Rollup(
+            student_id=row.student_id,
+            class_id=row.class_id,
+            sessions_held=row.total_sessions,
+            present_count=row.total_present,
+            last_attended=row.last_attended,
+        )
+        for row in rows
+    ])
+    db.flush()
+    mark_dirty(db, class_ids={row.class_id for row in rows}, student_ids={row.student_id for row in rows})
+    return len(rows)
+
+
+def record_attendance(db: Session, class_id: int, student_ids: Iterable[int], attended_at: datetime):
+    """
+    Call after the new Attendance rows are added/flushed and before commit.
+    """
+    student_ids = list(student_ids)
+    if not student_ids:
+        return
+
+    db.flush()
+    result = db.execute(
+        _update(Rollup.class_id == class_id, Rollup.student_id.in_(student_ids))
+        .values(present_count=Rollup.present_count + 1, last_attended=attended_at)
+    )
+    mark_dirty(db, class_ids=[class_id], student_ids=student_ids)
+    if result.rowcount != len(student_ids):
+        # Membership created outside the API (e.g. a script): build the row from scratch,
+        # which already includes the attendance flushed above
+        for student_id in student_ids:
+            ensure_rows(db, class_id=class_id, student_id=student_id)
+
+
+def session_created(db: Session, session: models.AttendanceSession):
+    if not session.is_active:
+        return
+    db.execute(
+        _update(Rollup.class_id == session.class_id)
+        .values(sessions_held=Rollup.sessions_held + 1)
+    )
+    mark_dirty(db, class_ids=[session.class_id])
+
+
+def session_deactivated(db: Session, session: models.AttendanceSession):
+    """
+    Call when an active session is soft-deleted, before commit: the session and
+    its attendances stop counting.
+    """
+    history = attendance_history()
+    attended = (
+        select(history.c.student_id)
+        .where(history.c.session_id == session.id, history.c.status == "Hadir")
+        .scalar_subquery()
+    )
+    db.execute(
+        _update(Rollup.class_id == session.class_id)
+        .values(sessions_held=Rollup.sessions_held - 1)
+    )
+    db.flush()  # session.is_active = False must be visible to the last_attended subquery
+    last_attended = (
+        select(func.max(history.c.timestamp))
+        .join(models.AttendanceSession, history.c.session_id == models.AttendanceSession.id)
+        .where(
+            models.AttendanceSession.class_id == Rollup.class_id,
+            models.AttendanceSession.is_active == True,
+            history.c.student_id == Rollup.student_id,
+            history.c.status == "Hadir",
+        )
+        .scalar_subquery()
+    )
+    db.execute(
+        _update(Rollup.class_id == session.class_id, Rollup.student_id.in_(attended))
+        .values(present_count=Rollup.present_count - 1, last_attended=last_attended)
+    )
+    mark_dirty(db, class_ids=[session.class_id])
+
+
+def rebuild(db: Session) -> int:
+    """
+    Recomputes the whole table from attendances and sessions. Does not commit.
+    """
+    db.execute(delete(Rollup))
+    mark_dirty(db, everything=True)
+    return ensure_rows(db)
+
+
+if __name__ == "__main__":
+    from app.database import SessionLocal, init_db
+
+    init_db()
+    db = SessionLocal()
+    try:
+        count = rebuild(db)
+        db.commit()
+        print(f"[OK] attendance_rollups rebuilt: {count} rows")
+    finally:
+        db.close()
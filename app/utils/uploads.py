@@ -0,0 +1,69 @@
+"""
+Bounded upload handling.
+
+UploadSizeLimitMiddleware rejects oversized request bodies with 413 before they are
+parsed: right away when Content-Length is too big, otherwise as soon as the streamed
+body passes the limit. read_upload() reads an UploadFile in chunks with the same cap
+(starlette already spools large multipart files to a temp file, not to memory).
+"""
+from fastapi import HTTPException, UploadFile
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+
+from app import config
+
+UPLOAD_CHUNK_SIZE = 64 * 1024
+# Room for the multipart boundaries and the small form fields next to the photo
+FORM_OVERHEAD_BYTES = 64 * 1024
+
+
+def _too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(status_code=413, detail=f"Upload too large (max {max_bytes // 1024} KB)")
+
+
+class UploadSizeLimitMiddleware:
+    def __init__(self, app, max_bytes: int = config.MAX_UPLOAD_BYTES):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.max_body = max_bytes + FORM_OVERHEAD_BYTES
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("POST", "PUT", "PATCH"):
+            await self.app(scope, receive, send)
+            return
+
+        content_length = Headers(scope=scope).get("content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.max_body:
+            error = _too_large(self.max_bytes)
+            response = JSONResponse({"detail": error.detail}, status_code=error.status_code)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            # Chunked bodies (no Content-Length): stop reading once past the limit.
+            # FastAPI re-raises HTTPExceptions from body parsing, so this becomes a 413.
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body:
+                    raise _too_large(self.max_bytes)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+async def read_upload(file: UploadFile, max_bytes: int = config.MAX_UPLOAD_BYTES) -> bytes:
+    if file.size is not None and file.size > max_bytes:
+        raise _too_large(max_bytes)
+
+    chunks = []
+    total = 0
+    while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+        total += len(chunk)
+        if total > max_bytes:
+            raise _too_large(max_bytes)
+        chunks.append(chunk)
+    return b"".join(chunks)
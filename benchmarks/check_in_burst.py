@@ -0,0 +1,303 @@
+"""
+End-to-end load benchmark for a check-in burst.
+
+Boots the app in-process (lifespan included) against a temporary SQLite database,
+creates a class with --students enrolled students and an active face session, then
+fires concurrent requests through httpx's ASGI transport:
+
+    attendance   POST /attendance/            one check-in per student
+    report       GET  /reports/class/{id}     --requests times
+    list         GET  /attendance/?class_id   --requests times
+
+Phases run one after another, or all at once with --mixed. For each endpoint it
+reports throughput and latency percentiles (p50/p90/p95/p99/max), and the whole run
+can be written as JSON (--output) and compared with an earlier run (--baseline).
+
+--engine stub replaces the face engine with a fixed match after --stub-latency-ms,
+so only the web/DB layers are measured. --engine real runs ai_service through the
+face workers (FACE_WORKERS) and needs --photo with exactly one real face; the same
+photo is used to enroll every student.
+BackgroundTasks (evidence writes) finish before httpx's ASGI transport returns,
+so they are part of the measured check-in latency.
+
+Needs httpx (listed in requirements.txt for this script; the app itself does not use it).
+
+Usage:
+    python benchmarks/check_in_burst.py --students 500 --concurrency 100
+    python benchmarks/check_in_burst.py --engine real --photo face.jpg --output after.json --baseline before.json
+    SQLITE_PROFILE=production python benchmarks/check_in_burst.py --mixed
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PERCENTILES = (50, 90, 95, 99)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Check-in burst benchmark")
+    parser.add_argument("--students", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50, help="Requests in flight at the same time")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per GET endpoint")
+    parser.add_argument("--phases", default="attendance,report,list")
+    parser.add_argument("--mixed", action="store_true", help="Run all phases concurrently")
+    parser.add_argument("--engine", choices=["stub", "real"], default="stub")
+    parser.add_argument("--stub-latency-ms", type=float, default=0.0, help="Simulated face verification time")
+    parser.add_argument("--photo", help="JPEG with one face (required for --engine real)")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--baseline", help="Earlier --output file to compare against")
+    parser.add_argument("--keep", action="store_true", help="Keep the temporary database directory")
+    return parser.parse_args()
+
+
+def configure_environment(work_dir: str):
+    # app.config reads the environment on import, so this runs before any app import
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(work_dir, 'bench.db')}"
+    os.environ.pop("ASYNC_DATABASE_URL", None)
+    os.environ["EVIDENCE_DIR"] = os.path.join(work_dir, "evidence")
+    os.environ["EMBEDDING_STORE_DIR"] = os.path.join(work_dir, "embeddings")
+    os.environ["PROFILE_DIR"] = os.path.join(work_dir, "profiles")
+    sys.path.insert(0, ROOT)
+
+
+def dummy_photo() -> bytes:
+    # Only used with the stub engine: any decodable JPEG will do
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (640, 480), (128, 128, 128)).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+def enrollment_blob(args, photo: bytes) -> bytes:
+    from app.utils import ai_service, embedding_codec
+
+    if args.engine == "stub":
+        import numpy as np
+
+        return embedding_codec.encode(np.random.default_rng(0).normal(size=embedding_codec.LEGACY_DIM))
+    blob = ai_service.get_face_encoding(photo)
+    if blob is None:
+        sys.exit("[ERROR] No face found in --photo")
+    return blob
+
+
+def create_dataset(n_students: int, face_encoding: bytes) -> int:
+    from app import models
+    from app.database import SessionLocal, init_db
+    from app.utils import rollup
+
+    init_db()
+    today = datetime.now().strftime("%Y-%m-%d")
+    with SessionLocal() as db:
+        kelas = models.Class(name="Benchmark")
+        db.add(kelas)
+        db.flush()
+        db.add_all(
+            models.Student(name=f"Student {i}", nim=f"B{i:06d}", class_id=kelas.id, face_encoding=face_encoding)
+            for i in range(n_students)
+        )
+        db.flush()
+        student_ids = [s for (s,) in db.query(models.Student.id).filter(models.Student.class_id == kelas.id)]
+        db.add_all(models.ClassMember(class_id=kelas.id, student_id=s) for s in student_ids)
+        db.add(models.AttendanceSession(
+            class_id=kelas.id, date=today, start_time="00:00", end_time="23:59", method="face", is_active=True
+        ))
+        db.flush()
+        rollup.rebuild(db)
+        db.commit()
+        return kelas.id
+
+
+def install_stub_engine(latency_ms: float):
+    from app.utils.face_engine import face_engine
+
+    async def validate_face(image_bytes, known_templates):
+        if latency_ms:
+            await asyncio.sleep(latency_ms / 1000)
+        return True, 0.95
+
+    # No worker pool: the stub never reaches ai_service
+    face_engine.start = lambda: None
+    face_engine.validate_face = validate_face
+
+
+def summarize(latencies: list[float], statuses: Counter, wall_s: float) -> dict:
+    ordered = sorted(latencies)
+
+    def percentile(p):
+        if not ordered:
+            return None
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] * 1000, 2)
+
+    return {
+        "requests": len(ordered),
+        "wall_s": round(wall_s, 3),
+        "throughput_rps": round(len(ordered) / wall_s, 1) if wall_s > 0 else None,
+        "latency_ms": {
+            **{f"p{p}": percentile(p) for p in PERCENTILES},
+            "mean": round(sum(ordered) / len(ordered) * 1000, 2) if ordered else None,
+            "max": round(ordered[-1] * 1000, 2) if ordered else None,
+        },
+        "statuses": dict(statuses),
+    }
+
+
+async def run_phase(semaphore, calls) -> dict:
+    latencies = []
+    statuses = Counter()
+
+    async def one(call):
+        async with semaphore:
+            start = time.perf_counter()
+            response = await call()
+            latencies.append(time.perf_counter() - start)
+        # Attendance answers 200 for rejections too: count them by their "status" field
+        outcome = str(response.status_code)
+        if response.status_code == 200 and response.headers.get("content-type", "").startswith("application/json"):
+            body = response.json()
+            if isinstance(body, dict) and "status" in body:
+                outcome = f"200 {body['status']}"
+        statuses[outcome] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(call) for call in calls))
+    return summarize(latencies, statuses, time.perf_counter() - start)
+
+
+def build_calls(client, phase: str, args, class_id: int, photo: bytes) -> list:
+    if phase == "attendance":
+        return [
+            lambda nim=f"B{i:06d}": client.post(
+                "/attendance/",
+                data={"nim": nim, "class_id": class_id, "method": "face"},
+                files={"file": ("photo.jpg", photo, "image/jpeg")},
+            )
+            for i in range(args.students)
+        ]
+    if phase == "report":
+        return [lambda: client.get(f"/reports/class/{class_id}") for _ in range(args.requests)]
+    if phase == "list":
+        return [lambda: client.get("/attendance/", params={"class_id": class_id}) for _ in range(args.requests)]
+    sys.exit(f"[ERROR] Unknown phase: {phase}")
+
+
+async def run(args, class_id: int, photo: bytes) -> tuple[dict, str]:
+    import httpx
+    from app.main import app
+
+    phases = [p.strip() for p in args.phases.split(",") if p.strip()]
+    results = {}
+    # ASGITransport does not send lifespan events: run startup/shutdown ourselves
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            semaphore = asyncio.Semaphore(args.concurrency)
+            if args.mixed:
+                names = list(phases)
+                summaries = await asyncio.gather(*(
+                    run_phase(semaphore, build_calls(client, phase, args, class_id, photo)) for phase in names
+                ))
+                results = dict(zip(names, summaries))
+            else:
+                for phase in phases:
+                    results[phase] = await run_phase(semaphore, build_calls(client, phase, args, class_id, photo))
+            metrics = (await client.get("/metrics")).text
+    return results, metrics
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=ROOT, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results: dict, baseline: dict = None):
+    print(f"{'phase':<12}{'req':>6}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}  statuses")
+    for phase, r in results.items():
+        lat = r["latency_ms"]
+        print(
+            f"{phase:<12}{r['requests']:>6}{r['throughput_rps']:>9}{lat['p50']:>9}{lat['p95']:>9}"
+            f"{lat['p99']:>9}{lat['max']:>9}  {r['statuses']}"
+        )
+        before = (baseline or {}).get(phase)
+        if before:
+            def delta(new, old):
+                return f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+            print(
+                f"{'  vs base':<12}{'':>6}{delta(r['throughput_rps'], before['throughput_rps']):>9}"
+                f"{delta(lat['p50'], before['latency_ms']['p50']):>9}{delta(lat['p95'], before['latency_ms']['p95']):>9}"
+                f"{delta(lat['p99'], before['latency_ms']['p99']):>9}{delta(lat['max'], before['latency_ms']['max']):>9}"
+            )
+
+
+def main():
+    args = parse_args()
+    if args.engine == "real" and not args.photo:
+        sys.exit("[ERROR] --engine real needs --photo")
+
+    work_dir = tempfile.mkdtemp(prefix="presence-bench-")
+    configure_environment(work_dir)
+    try:
+        from app import config
+
+        photo = open(args.photo, "rb").read() if args.photo else dummy_photo()
+        class_id = create_dataset(args.students, enrollment_blob(args, photo))
+        if args.engine == "stub":
+            install_stub_engine(args.stub_latency_ms)
+
+        results, metrics = asyncio.run(run(args, class_id, photo))
+
+        report = {
+            "meta": {
+                "timestamp": datetime.now().isoformat(timespec="seconds"),
+                "git_revision": git_revision(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "engine": args.engine,
+                "stub_latency_ms": args.stub_latency_ms if args.engine == "stub" else None,
+                "face_workers": config.FACE_WORKERS if args.engine == "real" else None,
+                "sqlite_profile": config.SQLITE_PROFILE,
+                "students": args.students,
+                "concurrency": args.concurrency,
+                "requests": args.requests,
+                "mixed": args.mixed,
+            },
+            "results": results,
+            # Server-side stage histograms of this run (see app/utils/metrics.py)
+            "metrics": metrics,
+        }
+
+        baseline = None
+        if args.baseline:
+            with open(args.baseline) as f:
+                baseline = json.load(f)["results"]
+        print_results(results, baseline)
+
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(report, f, indent=2)
+            print(f"[OK] Results written to {args.output}")
+    finally:
+        if args.keep:
+            print(f"[INFO] Benchmark data kept in {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""
+Generates a synthetic dataset at production scale into DATABASE_URL (replaces seed_db.py).
+
+Classes, students (each with a random face embedding), one membership per student, a
+semester of sessions per class and the attendance rows of those sessions are bulk
+inserted in a few large transactions with explicit ids, then the rollup table and the
+embedding store are rebuilt. The same --seed and --start-date produce the same data
+(sessions are only generated up to yesterday, so a semester still running grows daily).
+
+Usage:
+    python generate_dataset.py                        # 20 classes x 40 students, 16 weeks
+    python generate_dataset.py --reset --classes 500 --students 50000 --weeks 16
+    python generate_dataset.py --demo-session         # + an active face session now for class 1
+
+--demo-session does what seed_db.py did: it opens a session around the current time
+for the first class, so POST /attendance/ can be tried right away with nim S0000001.
+"""
+import argparse
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import func, insert, select
+
+from app import models
+from app.database import Base, SessionLocal, engine, init_db
+from app.utils import embedding_codec, rollup
+from app.utils.embedding_store import embedding_store
+
+BATCH_SIZE = 50000
+ATTENDANCE_COLUMNS = ["student_id", "session_id", "timestamp", "date", "status", "method", "confidence_score", "image_path"]
+# SQLAlchemy's storage format for DateTime on SQLite
+SQLITE_DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+SESSION_SLOTS = [("07:30", "09:10"), ("09:20", "11:00"), ("13:00", "14:40"), ("15:00", "16:40")]
+FIRST_NAMES = ["Andi", "Budi", "Citra", "Dewi", "Eka", "Fajar", "Gita", "Hadi", "Indah", "Joko",
+               "Kartika", "Lestari", "Made", "Nur", "Putri", "Rizki", "Sari", "Tono", "Wulan", "Yusuf"]
+LAST_NAMES = ["Pratama", "Saputra", "Wijaya", "Santoso", "Hidayat", "Nugroho", "Lestari", "Kurniawan",
+              "Siregar", "Nasution", "Halim", "Gunawan", "Susanto", "Rahman", "Setiawan", "Utami"]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Bulk synthetic dataset generator")
+    parser.add_argument("--classes", type=int, default=20)
+    parser.add_argument("--students", type=int, default=800, help="Total students, spread evenly over the classes")
+    parser.add_argument("--weeks", type=int, default=16, help="Length of the semester")
+    parser.add_argument("--sessions-per-week", type=int, default=2, help="Sessions per class per week")
+    parser.add_argument("--attendance-rate", type=float, default=0.85, help="Chance a student attends a session")
+    parser.add_argument("--start-date", help="First day of the semester (YYYY-MM-DD); default: --weeks before today")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--reset", action="store_true", help="Drop and recreate all tables first")
+    parser.add_argument("--demo-session", action="store_true", help="Open an active session now for the first class")
+    return parser.parse_args()
+
+
+def _insert_batches(db, model, rows):
+    # Core executemany in BATCH_SIZE chunks; rows may be a generator
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            db.execute(insert(model), batch)
+            batch = []
+    if batch:
+        db.execute(insert(model), batch)
+
+
+def _insert_attendance(db, rows):
+    """
+    rows: tuples in ATTENDANCE_COLUMNS order. This is by far the largest table, so on
+    SQLite it goes straight to the driver's executemany (several times faster than
+    Core inserts, which process every parameter dict); other databases use Core.
+    """
+    sqlite = db.get_bind().dialect.name == "sqlite"
+    table = models.Attendance.__table__
+    sql = f"INSERT INTO {table.name} ({', '.join(ATTENDANCE_COLUMNS)}) VALUES ({', '.join('?' * len(ATTENDANCE_COLUMNS))})"
+
+    def flush(batch):
+        if sqlite:
+            db.connection().exec_driver_sql(
+                sql, [(*row[:2], row[2].strftime(SQLITE_DATETIME_FORMAT), *row[3:]) for row in batch]
+            )
+        else:
+            db.execute(insert(table), [dict(zip(ATTENDANCE_COLUMNS, row)) for row in batch])
+
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+
+
+def generate(db, args):
+    import numpy as np
+
+    rng = np.random.default_rng(args.seed)
+    names = random.Random(args.seed)
+    start = date.fromisoformat(args.start_date) if args.start_date else date.today() - timedelta(weeks=args.weeks)
+    timer = time.perf_counter()
+
+    def done(label: str, count: int):
+        print(f"[OK] {count:>10,} {label} ({time.perf_counter() - timer:.1f} s)")
+
+    # 1. Kelas
+    _insert_batches(db, models.Class, ({"id": c, "name": f"Kelas {c:03d}"} for c in range(1, args.classes + 1)))
+    done("classes", args.classes)
+
+    # 2. Siswa + embedding acak (ternormalisasi seperti embedding dlib) + membership
+    class_of = np.arange(args.students) % args.classes + 1
+    embeddings = rng.normal(size=(args.students, embedding_codec.LEGACY_DIM)).astype(np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    _insert_batches(db, models.Student, (
+        {
+            "id": i + 1,
+            "name": f"{names.choice(FIRST_NAMES)} {names.choice(LAST_NAMES)}",
+            "nim": f"S{i + 1:07d}",
+            "class_id": int(class_of[i]),
+            "face_encoding": embedding_codec.encode(embeddings[i]),  # In config.EMBEDDING_DTYPE
+        }
+        for i in range(args.students)
+    ))
+    _insert_batches(db, models.ClassMember, (
+        {"id": i + 1, "class_id": int(class_of[i]), "student_id": i + 1} for i in range(args.students)
+    ))
+    done("students + memberships", args.students)
+
+    # 3. Sesi: sessions_per_week hari kerja per minggu, slot waktu tetap per kelas
+    sessions = []  # (session_id, class_id, date, start_time, end_time)
+    for class_id in range(1, args.classes + 1):
+        slot = SESSION_SLOTS[class_id % len(SESSION_SLOTS)]
+        weekdays = sorted(rng.choice(5, size=min(args.sessions_per_week, 5), replace=False))
+        for week in range(args.weeks):
+            for weekday in weekdays:
+                day = start + timedelta(weeks=week, days=int(weekday) - start.weekday())
+                if start <= day < date.today():
+                    sessions.append((len(sessions) + 1, class_id, day.isoformat(), *slot))
+    _insert_batches(db, models.AttendanceSession, (
+        {"id": sid, "class_id": c, "date": d, "start_time": s, "end_time": e, "method": "face",
+         "is_active": True, "created_at": datetime.fromisoformat(f"{d} {s}")}
+        for sid, c, d, s, e in sessions
+    ))
+    done("sessions", len(sessions))
+
+    # 4. Absensi: tiap anggota kelas hadir dengan peluang attendance_rate
+    members = {c: np.flatnonzero(class_of == c) + 1 for c in range(1, args.classes + 1)}
+
+    def attendance_rows():
+        for sid, class_id, day, start_time, _ in sessions:
+            present = members[class_id][rng.random(len(members[class_id])) < args.attendance_rate]
+            session_start = datetime.fromisoformat(f"{day} {start_time}")
+            offsets = rng.integers(0, 15 * 60, size=len(present))
+            scores = rng.uniform(0.8, 0.99, size=len(present))
+            for student_id, offset, score in zip(present.tolist(), offsets.tolist(), scores.tolist()):
+                yield (student_id, sid, session_start + timedelta(seconds=offset), day, "Hadir", "face", round(score, 4), None)
+
+    _insert_attendance(db, attendance_rows())
+    done("attendance rows", db.scalar(select(func.count(models.Attendance.id))))
+
+    # 5. Tabel rekap
+    done("rollup rows", rollup.rebuild(db))
+
+
+def open_demo_session(db):
+    kelas = db.query(models.Class).order_by(models.Class.id).first()
+    if kelas is None:
+        print("[ERROR] No class to open a session for")
+        return
+    now = datetime.now()
+    session = models.AttendanceSession(
+        class_id=kelas.id,
+        date=now.strftime("%Y-%m-%d"),
+        start_time=(now - timedelta(hours=1)).strftime("%H:%M"),
+        end_time=(now + timedelta(hours=2)).strftime("%H:%M"),
+        method="face",
+        is_active=True,
+    )
+    db.add(session)
+    db.flush()
+    rollup.session_created(db, session)
+    student = db.query(models.Student).filter(models.Student.class_id == kelas.id).order_by(models.Student.id).first()
+    print(f"[OK] Sesi absensi DIBUKA: {kelas.name} (class_id {kelas.id}), {session.start_time} s/d {session.end_time}, metode FACE")
+    if student is not None:
+        print(f"     Coba POST /attendance/ dengan nim={student.nim}, class_id={kelas.id}, method=face")
+
+
+def main():
+    args = parse_args()
+    if args.reset:
+        Base.metadata.drop_all(bind=engine)
+    init_db()
+
+    with SessionLocal() as db:
+        if db.scalar(select(func.count(models.Student.id))):
+            if not args.demo_session:
+                sys.exit("[ERROR] Database already has students: use --reset to regenerate")
+        else:
+            # One transaction for the whole load
+            generate(db, args)
+            db.commit()
+            embedding_store.export(db)
+            print("[OK] Embedding store exported")
+
+        if args.demo_session:
+            open_demo_session(db)
+            db.commit()
+
+
+if __name__ == "__main__":
+    main()
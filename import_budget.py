@@ -0,0 +1,64 @@
+"""
+Measures how long `import app.main` takes in a fresh interpreter.
+Fails (exit code 1) if it exceeds the budget or if a heavy AI library
+is imported eagerly instead of by the inference path.
+
+Usage:
+    python import_budget.py
+    IMPORT_BUDGET_MS=1000 python import_budget.py
+"""
+import os
+import subprocess
+import sys
+
+BUDGET_MS = float(os.getenv("IMPORT_BUDGET_MS", "3000"))
+HEAVY_MODULES = ["face_recognition", "dlib", "cv2", "numpy", "PIL"]
+
+
+def measure(module: str = "app.main"):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    if result.returncode != 0:
+        print(result.stderr)
+        sys.exit(result.returncode)
+
+    # Lines look like: "import time:   self [us] | cumulative | imported package"
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        entries.append((name.strip(), int(self_us), int(cumulative_us)))
+    return entries
+
+
+def main():
+    entries = measure()
+    total_ms = next(cum for name, _, cum in entries if name == "app.main") / 1000
+    imported = {name for name, _, _ in entries}
+
+    print(f"import app.main: {total_ms:.0f} ms (budget {BUDGET_MS:.0f} ms)")
+    print("Slowest modules (self time):")
+    for name, self_us, _ in sorted(entries, key=lambda e: e[1], reverse=True)[:10]:
+        print(f"  {self_us / 1000:8.1f} ms  {name}")
+
+    failed = False
+    eager = [m for m in HEAVY_MODULES if m in imported]
+    if eager:
+        print(f"[FAIL] Heavy modules imported at startup: {', '.join(eager)}")
+        failed = True
+    if total_ms > BUDGET_MS:
+        print("[FAIL] Import time over budget")
+        failed = True
+
+    if failed:
+        sys.exit(1)
+    print("[OK] Import time within budget")
+
+
+if __name__ == "__main__":
+    main()